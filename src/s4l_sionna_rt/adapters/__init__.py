@@ -12,4 +12,10 @@ from .Sample_Positions import *
 from .File import *
 from .Base import *
 from .Resizing import *
-from .Rescaling import *
\ No newline at end of file
+from .Rescaling import *
+from .Beam_Sweep import *
+from .Path_Pruning import *
+from .Time_Evolution import *
+from .Trajectory import *
+from .Receiver_Set import *
+from .Dataset import *
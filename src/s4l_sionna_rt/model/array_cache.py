@@ -0,0 +1,72 @@
+"""
+Least-recently-used cache of NumPy arrays with a memory cap, used by the
+simulation extractor to keep decoded result arrays and per-selection slices
+between plot requests.
+"""
+
+from collections import OrderedDict
+import logging
+import threading
+from typing import Callable, Hashable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def _nbytes(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, tuple):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+class ArrayCache:
+    """
+    LRU cache of NumPy arrays, or tuples of arrays. Thread-safe; arrays
+    computed before the last clear() are returned but not cached, so a task
+    still running on outdated data cannot store it.
+
+    Args:
+        max_bytes: Memory cap of the cached arrays [bytes]. The least recently
+            used arrays are evicted once the cap is exceeded. An array larger
+            than the cap is returned without being cached.
+    """
+
+    def __init__(self, max_bytes: int = 256*2**20):
+        self.max_bytes = max_bytes
+        self._items: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], np.ndarray]):
+        """Returns the cached array of `key`, computing and caching it if missing"""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+            generation = self._generation
+
+        # Computed without the lock, compute() may use the cache itself
+        value = compute()
+        nbytes = _nbytes(value)
+        with self._lock:
+            if nbytes <= self.max_bytes and generation == self._generation and key not in self._items:
+                self._items[key] = value
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._items.popitem(last=False)
+                    self._bytes -= _nbytes(evicted)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+            self._generation += 1
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the cached arrays [bytes]"""
+        return self._bytes
@@ -0,0 +1,98 @@
+"""
+Level-of-detail reduction of plot data, used by the plot builders so that
+large radio maps and long traces are sent to the plot manager at roughly the
+resolution they are displayed at.
+
+Maps are reduced by pooling square blocks of cells (mean or max), traces by
+keeping the minimum and the maximum of every bucket of samples, so that peaks
+and nulls remain visible.
+"""
+
+import warnings
+
+import numpy as np
+
+POOLING = ("max", "mean")
+
+
+def pooling_factor(shape, max_cells: int) -> int:
+    """Smallest block size for which a map of `shape` has at most `max_cells` cells"""
+    factor = max(1, int(np.sqrt(np.prod(shape)/max_cells)))
+    while np.prod([int(np.ceil(n/factor)) for n in shape]) > max_cells:
+        factor += 1
+    return factor
+
+
+def _pad(z: np.ndarray, factor: int) -> np.ndarray:
+    pad = [(0, -n % factor) for n in z.shape]
+    return np.pad(z.astype(np.float64), pad, constant_values=np.nan)
+
+
+def pool_map(z, max_cells: int, pooling: str = "max"):
+    """
+    Reduces a 2D map to at most `max_cells` cells by pooling square blocks.
+    NaN cells are ignored, blocks at the upper edges may be incomplete.
+
+    Args:
+        z: Map [num_y, num_x]
+        max_cells: Cell budget
+        pooling: "max" or "mean"
+
+    Returns:
+        A tuple (pooled map, block size)
+    """
+    z = np.asarray(z)
+    factor = pooling_factor(z.shape, max_cells)
+    if factor == 1:
+        return z, 1
+    if pooling not in POOLING:
+        raise ValueError(f"Unknown pooling '{pooling}', expected one of {POOLING}")
+
+    ny, nx = [int(np.ceil(n/factor)) for n in z.shape]
+    blocks = _pad(z, factor).reshape(ny, factor, nx, factor)
+    with warnings.catch_warnings():
+        # Blocks of NaN cells stay NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if pooling == "max":
+            return np.nanmax(blocks, axis=(1, 3)), factor
+        return np.nanmean(blocks, axis=(1, 3)), factor
+
+
+def pool_coordinates(x, factor: int) -> np.ndarray:
+    """Coordinates of the blocks of `pool_map`, the mean of the cell coordinates of every block"""
+    x = np.asarray(x, dtype=np.float64)
+    if factor == 1:
+        return x
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmean(_pad(x, factor).reshape(-1, factor), axis=1)
+
+
+def decimate_trace(x, y, max_points: int):
+    """
+    Reduces a trace to at most `max_points` samples, keeping the minimum
+    and the maximum of every bucket of consecutive samples in their order.
+
+    Args:
+        x: Sample positions [num_samples]
+        y: Real sample values [num_samples]
+        max_points: Sample budget, raised to 2 if smaller
+
+    Returns:
+        A tuple (x, y) of the kept samples
+    """
+    max_points = max(2, int(max_points))
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(y) <= max_points:
+        return x, y
+
+    size = int(np.ceil(len(y)/(max_points//2)))
+    buckets = _pad(y, size).reshape(-1, size)
+    # NaN samples, including the padding, are never selected unless a whole bucket is NaN
+    i_min = np.argmin(np.where(np.isnan(buckets), np.inf, buckets), axis=1)
+    i_max = np.argmax(np.where(np.isnan(buckets), -np.inf, buckets), axis=1)
+    offset = np.arange(len(buckets))*size
+    keep = np.unique(np.concatenate([offset + i_min, offset + i_max]))
+    keep = keep[keep < len(y)]
+    return x[keep], y[keep]
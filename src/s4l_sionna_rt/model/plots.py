@@ -1,11 +1,20 @@
 from PIL import Image
 import plotly.graph_objects as go
 import numpy as np
+import base64
+import functools
+import io
 import math
 import logging
+import os
+from s4l_sionna_rt.model.decimation import decimate_trace, pool_coordinates, pool_map
 
 logger = logging.getLogger(__name__)
 
+# Largest number of heatmap cells and of line plot samples sent to the plot manager
+MAX_HEATMAP_CELLS = 250000
+MAX_LINE_POINTS = 4000
+
 """
 
 Plots that can be used for the visualization of the results 
@@ -13,12 +22,49 @@ in the simulation extractor for the postprocessing analysis
 
 """
 
-def generate_image(path, title) -> dict:
+@functools.lru_cache(maxsize=8)
+def _image_source(path, mtime, max_size, fmt) -> str:
+    # The modification time is part of the key, so that a new render is encoded again
+    with Image.open(path) as img:
+        if max_size is None and img.format.lower() == fmt:
+            # Already compressed in the requested format
+            with open(path, "rb") as f:
+                return f"data:image/{fmt};base64," + base64.b64encode(f.read()).decode("ascii")
+        if max_size is not None:
+            img.thumbnail((max_size, max_size))
+        buffer = io.BytesIO()
+        if fmt == "jpeg":
+            img.convert("RGB").save(buffer, format="JPEG", quality=90)
+        else:
+            img.save(buffer, format="PNG", optimize=False)
+    return f"data:image/{fmt};base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def image_source(path, max_size=None, fmt="png") -> str:
+    """
+    Compressed data URI of an image file, cached per file and settings.
+
+    Args:
+        path: Image file
+        max_size: Largest width or height of a downscaled preview [pixels],
+            or None for the full resolution
+        fmt: "png" or "jpeg"
+    """
+    return _image_source(str(path), os.path.getmtime(path), max_size, fmt)
+
+
+def generate_image(path, title, max_size=None, fmt="png") -> dict:
+    """
+    Image plot of a rendered scene. The image is passed as a compressed
+    data URI instead of a pixel array.
+
+    Args:
+        max_size: Largest width or height of a downscaled preview [pixels],
+            or None for the full resolution
+        fmt: "png" or "jpeg"
+    """
     id = "1"
 
-    img = Image.open(path)
-    img_array = np.array(img)
-    img_list = img_array.tolist()
     plot_config = {
         "id": "1",
         "title": title,  # Top-level title
@@ -26,7 +72,7 @@ def generate_image(path, title) -> dict:
             {
                 "name": title,  # Required field
                 "type": "image",
-                "z": img_list,
+                "source": image_source(path, max_size, fmt),
                 "showlegend": False,
                 "visible": True
             }
@@ -56,16 +102,28 @@ def generate_image(path, title) -> dict:
     return plot_config
     
 
-def generate_line_plot(y, x_axis_title, y_axis_title, title) -> dict:
+def generate_line_plot(y, x_axis_title, y_axis_title, title, x=None, max_points=MAX_LINE_POINTS) -> dict:
+    """
+    Line plot of the real part of `y`, a NumPy array or a list of
+    {"real", "imag"} dictionaries. Traces longer than `max_points` are
+    decimated, keeping the minimum and maximum of every bucket of samples.
+
+    Args:
+        x: Sample positions, the sample indices by default
+        max_points: Sample budget, or None to plot every sample
+    """
     id = "1"
     
     trace_name = "Line Trace"
     y_axis_range = None
-    y_values = [e["real"] for e in y[:]]
-    logger.info(y_values)
-    logger.info(type(y_values[0]))
-    x = list(np.linspace(0, len(y_values), len(y_values), dtype=int))
-    x_values = [f"{v:.1f}" for v in x]
+    if len(y) != 0 and isinstance(y[0], dict):
+        y = [e["real"] for e in y]
+    y = np.real(np.asarray(y))
+    x = np.arange(len(y)) if x is None else np.asarray(x)
+    if max_points is not None:
+        x, y = decimate_trace(x, y, max_points)
+    x_values = x.tolist()
+    y_values = y.tolist()
     line_color = "rgb(57,231,95)"
     line_dash = "0"
 
@@ -249,10 +307,25 @@ def generate_cir_binned_histogram(bin_edges, hist, title="Binned Channel Impulse
 
 
 
-def generate_heatmap(x,y,z_data, title, name, vmin=None, vmax=None) -> dict:
+def generate_heatmap(x,y,z_data, title, name, vmin=None, vmax=None, max_cells=MAX_HEATMAP_CELLS, pooling="max") -> dict:
+    """
+    Heatmap of `z_data` [len(y), len(x)]. Maps with more than `max_cells`
+    cells are reduced by pooling square blocks of cells.
+
+    Args:
+        max_cells: Cell budget, or None to plot every cell
+        pooling: "max" (keeps peaks) or "mean"
+    """
     id = "5"
-    x_labels = [f"{v:.1f}" for v in x]
-    y_labels = [f"{v:.1f}" for v in y]
+    z_data = np.asarray(z_data)
+    if max_cells is not None:
+        z_data, factor = pool_map(z_data, max_cells, pooling)
+        x = pool_coordinates(x, factor)
+        y = pool_coordinates(y, factor)
+        if factor > 1:
+            title = f"{title} ({factor}x{factor} {pooling} pooling)"
+    x_labels = np.asarray(x).tolist()
+    y_labels = np.asarray(y).tolist()
     x_axis_title = "Cell index (X Axis)"
     y_axis_title = "Cell index (Y Axis)"
     colorscale = "Viridis"
@@ -321,6 +394,79 @@ def generate_heatmap(x,y,z_data, title, name, vmin=None, vmax=None) -> dict:
     return plot_config
 
 
+def generate_cdf_plot(curves, title, xaxis) -> dict:
+    """
+    Empirical CDFs, one trace per entry of `curves`.
+
+    Args:
+        curves: Dictionary {name: {"value": [...], "probability": [...]}}
+    """
+    id = "8"
+    data = []
+    for name, curve in curves.items():
+        points = [(v, p) for v, p in zip(curve["value"], curve["probability"]) if v is not None]
+        data.append({
+            "type": "scatter",
+            "mode": "lines",
+            "x": [v for v, _ in points],
+            "y": [p for _, p in points],
+            "name": name,
+            "line": {"shape": "hv"}
+        })
+
+    plot_config = {
+        "id": id,
+        "title": title,
+        "data": data,
+        "layout": {
+            "title": {
+                "text": title
+            },
+            "xaxis": {
+                "title": xaxis
+            },
+            "yaxis": {
+                "title": "CDF",
+                "range": [0, 1]
+            },
+            "annotations": [],
+            "margin": {}
+        }
+    }
+    return plot_config
+
+
+def generate_table(columns, title) -> dict:
+    """
+    Table with one column per entry of `columns` ({header: values})
+    """
+    id = "9"
+    plot_config = {
+        "id": id,
+        "title": title,
+        "data": [
+            {
+                "type": "table",
+                "header": {
+                    "values": list(columns.keys())
+                },
+                "cells": {
+                    "values": [list(v) for v in columns.values()]
+                },
+                "name": title
+            }
+        ],
+        "layout": {
+            "title": {
+                "text": title
+            },
+            "annotations": [],
+            "margin": {}
+        }
+    }
+    return plot_config
+
+
 def generate_3d_scatter() -> dict:
     id = "6"
     title = "3D Scatter Plot"
@@ -3,21 +3,57 @@
 
 import json
 import logging
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable
 import asyncio
 import s4l_sionna_rt.solver.driver.api_models as mdl
 import s4l_core.simulator_plugins.common.plugin_plot_manager as ppm
 import s4l_sionna_rt.model.plots as plots_functions
+from s4l_sionna_rt.model.array_cache import ArrayCache
+from s4l_sionna_rt.model.decimation import POOLING
+import s4l_sionna_rt.solver.driver.radio_map_utils as rm_utils
+import s4l_sionna_rt.solver.driver.results_io as rio
 import XCore as xc
 import XPostProcessor as xp
 import XPostProPython as pp
 import numpy as np
-from sionna.rt.utils import watt_to_dbm, log10
-from drjit.llvm import TensorXf
 
 FILENAME_SUFFIX = ".vtr"
 JSON_OUTPUT = "summary.json"
+# Plot name: (key in the "kpi" summary, axis label)
+KPI_MAPS = {
+    "Serving cell": ("serving_cell", "Transmitter index (-1: no signal)"),
+    "Best-server RSS": ("best_rss", "Received signal strength [dBm]"),
+    "Best-server SINR": ("best_sinr", "SINR [dB]"),
+    "Capacity": ("capacity", "Shannon capacity [bit/s]"),
+}
+KPI_CDFS = {
+    "Best-server RSS CDF": ("best_rss", "Received signal strength [dBm]"),
+    "Best-server SINR CDF": ("best_sinr", "SINR [dB]"),
+    "Capacity CDF": ("capacity", "Shannon capacity [bit/s]"),
+}
+# Plot name: (key in the summary, title prefix, axis label, unit in dB scale)
+RADIO_MAP_PLOTS = {
+    "SINR": ("sinr", "SINR", "Signal-to-interference-plus-noise ratio", "dB"),
+    "Path gain": ("path_gain", "Path gain", "Path_gain", "dB"),
+    "RSS": ("rss", "RSS", "Received signal strength(RSS)", "dBm"),
+}
+# Largest width or height of the downscaled render preview [pixels]
+IMAGE_PREVIEW_SIZE = 1024
+# Memory cap of the decoded arrays and plot slices kept by the extractor
+CACHE_MAX_BYTES = 512*2**20
+# Statistic: (key in the "link_stats" summary, label, shown in dB)
+LINK_STATS = {
+    "Total power": ("total_power", "Total power [dB]", True),
+    "Mean excess delay": ("mean_excess_delay", "Mean excess delay [ns]", False),
+    "RMS delay spread": ("rms_delay_spread", "RMS delay spread [ns]", False),
+    "K-factor": ("k_factor", "Rician K-factor [dB]", True),
+    "Significant paths": ("num_significant_paths", "Number of significant paths", False),
+}
 
 logger = logging.getLogger(__name__)
 
@@ -104,24 +140,228 @@ class SimulationExtractorImpl:
         self._parent = parent
         self._outputs: list[xp.DataObject | None] = []
         self._extractors: list[xp.VtkFieldImporter] = []
-        self.json_data: dict = {}
+        self.manifest: dict = {}
+        self._json_data: dict | None = None
+        self._summary_path: Path | None = None
+        self._sparse_cir: dict | None = None
+        self._cfr: np.ndarray | None = None
+        self._cache = ArrayCache(CACHE_MAX_BYTES)
+        # A single worker, so that loads and plots never run concurrently on the cached data
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sionna_extractor")
+        # Guards the lazily loaded data. The generation is increased whenever other
+        # results are loaded, so that tasks still running on the previous ones
+        # cannot store their data
+        self._state_lock = threading.Lock()
+        self._generation = 0
+        self._tasks: dict[str, asyncio.Future] = {}
+        self._status_prop: xc.PropertyString | None = None
 
     def _load_json_data(self, filepath: Path):
         """
-        Loads simulation summary data from a JSON file into a data object.
-        
-        Reads from the JSON file and creates a structured data object that 
-        can be displayed in the post-processor.
-        
+        Loads the manifest of the simulation results. The summary itself is
+        only parsed when its data is first needed for a plot, so opening the
+        results does not depend on their size.
+
+        Results written without a manifest are described from the summary.
+
         Args:
             filepath: Path to the summary JSON file
-            
+
         Returns:
-            A dictionary containing the structured summary data
+            The manifest, with the entries, array shapes and axis labels of the summary
+        """
+        for kind in list(self._tasks):
+            self.cancel(kind)
+        with self._state_lock:
+            self._generation += 1
+            self._summary_path = filepath
+            self._json_data = None
+            self._sparse_cir = None
+            self._cfr = None
+            self._cache.clear()
+        self.manifest = rio.load_manifest(str(filepath.parent))
+        if self.manifest is None:
+            logger.info(f"No {rio.MANIFEST_OUTPUT} in {filepath.parent}, reading the summary")
+            shapes = {"h_freq": self._cfr_file().shape} if "h_freq_file" in self.json_data else None
+            self.manifest = rio.build_manifest(self.json_data, shapes)
+        return self.manifest
+
+    def _store(self, name: str, value, generation: int):
+        """
+        Stores lazily loaded data in the attribute `name`, unless other results
+        were loaded since `generation`. Returns the stored value.
         """
-        with open(filepath) as fh:
-            self.json_data = json.load(fh)
-        return self.json_data
+        with self._state_lock:
+            if generation != self._generation:
+                return value
+            if getattr(self, name) is None:
+                setattr(self, name, value)
+            return getattr(self, name)
+
+    @property
+    def json_data(self) -> dict:
+        """Summary data, loaded on first access"""
+        with self._state_lock:
+            if self._json_data is not None:
+                return self._json_data
+            generation, path = self._generation, self._summary_path
+        with open(path) as fh:
+            return self._store("_json_data", json.load(fh), generation)
+
+    def _set_status(self, text: str) -> None:
+        if self._status_prop is not None:
+            self._status_prop.Value = text
+
+    def run_in_background(self, kind: str, work: Callable, on_done: Callable | None = None,
+                          status: str = "Working") -> asyncio.Future:
+        """
+        Runs `work` in the worker thread of the extractor and passes its result
+        to `on_done` in the event loop, keeping the UI responsive. The status
+        property shows the progress.
+
+        A task of the same kind that is still pending is cancelled. A task that
+        is already running cannot be interrupted, its result is discarded and
+        the data it loads is not stored once other results are loaded.
+
+        Args:
+            kind: Task kind, e.g. "load" or "plot"
+            work: Function without arguments, run in the worker thread
+            on_done: Called with the result of `work` in the event loop
+            status: Description of the task shown in the status property
+        """
+        self.cancel(kind)
+        self._set_status(f"{status}...")
+        start = time.perf_counter()
+        future = asyncio.get_event_loop().run_in_executor(self._executor, work)
+        self._tasks[kind] = future
+
+        def done(f: asyncio.Future):
+            if self._tasks.get(kind) is not f:
+                # Cancelled or replaced by a newer task
+                return
+            del self._tasks[kind]
+            if f.exception() is not None:
+                logger.error(f"{status} failed: {f.exception()}")
+                self._set_status(f"{status}: failed")
+                return
+            elapsed = time.perf_counter() - start
+            logger.info(f"{status}: done in {elapsed:.2f} s")
+            self._set_status(f"{status}: done ({elapsed:.2f} s)")
+            if on_done is not None:
+                on_done(f.result())
+
+        future.add_done_callback(done)
+        return future
+
+    def cancel(self, kind: str) -> None:
+        """Cancels the background task of a kind, if any"""
+        future = self._tasks.pop(kind, None)
+        if future is not None and not future.done():
+            future.cancel()
+            self._set_status("Cancelled")
+
+    def _cfr_file(self) -> np.ndarray:
+        with self._state_lock:
+            if self._cfr is not None:
+                return self._cfr
+            generation = self._generation
+        cfr = rio.load_array(str(self._parent.output_files_dir / self.json_data["h_freq_file"]))
+        return self._store("_cfr", cfr, generation)
+
+    def cfr_shape(self) -> tuple:
+        """Shape of the CFR [num_rx, num_rx_ant, num_tx, num_tx_ant, num_time_steps, num_subcarriers]"""
+        return tuple(self.manifest["arrays"]["h_freq"]["shape"])
+
+    def axis_labels(self, array: str, axis: str) -> list:
+        """
+        Option labels of one axis of a summary array, with the transmitter and
+        receiver names where available.
+
+        Args:
+            array: Array name in the manifest, e.g. "h_freq"
+            axis: Axis label, e.g. "rx" or "tx_ant"
+        """
+        entry = self.manifest["arrays"][array]
+        size = entry["shape"][entry["axes"].index(axis)]
+        names = {"tx": self.manifest.get("tx_names", []), "rx": self.manifest.get("rx_names", [])}.get(axis, [])
+        prefix = {"tx": "Transmitter", "rx": "Receiver", "tx_ant": "TX_ant", "rx_ant": "RX_ant",
+                  "time": "Timestep"}.get(axis, axis)
+        if len(names) == size:
+            return [f"{prefix} {i}: {n}" for i, n in enumerate(names)]
+        return [f"{prefix} {i}" for i in range(size)]
+
+    def array(self, key: str) -> np.ndarray:
+        """Array of a summary entry, decoded once and cached"""
+        return self._cache.get(("array", key), lambda: np.array(self.json_data[key]))
+
+    def radio_map_slice(self, key: str, tx_index: int, db_scale: bool) -> np.ndarray:
+        """
+        Radio map of one transmitter as plotted. In dB scale, cells without
+        signal are set just below the smallest finite value.
+
+        Args:
+            key: "path_gain", "rss" or "sinr"
+            tx_index: Transmitter index
+            db_scale: Convert to dB (dBm for the RSS)
+        """
+        def compute():
+            z_data = self.array(key)[tx_index]
+            if not db_scale:
+                return z_data
+            with np.errstate(divide="ignore"):
+                z_data = 10*np.log10(z_data.astype(np.float32)) + (30. if key == "rss" else 0.)
+            finite = np.isfinite(z_data)
+            if np.any(finite):
+                z_data = np.where(np.isneginf(z_data), np.min(z_data[finite]) - 1, z_data)
+            return z_data
+        return self._cache.get(("radio_map", key, tx_index, db_scale), compute)
+
+    def cfr_link(self, index) -> np.ndarray:
+        """
+        Returns the complex CFR [num_subcarriers] of one link and time step,
+        from the summary data or from the memory-mapped CFR file.
+
+        Args:
+            index: (rx, rx_ant, tx, tx_ant, time_step)
+        """
+        def compute():
+            if "h_freq_file" in self.json_data:
+                return np.array(self._cfr_file()[tuple(index)])
+            ind1, ind2, ind3, ind4, ind5 = index
+            return np.array([complex(d["real"], d["imag"]) for d in self.json_data["h_freq"][ind1][ind2][ind3][ind4][ind5]])
+        return self._cache.get(("cfr", tuple(index)), compute)
+
+    def cir_link(self, index) -> tuple:
+        """
+        Returns the CIR of one link, from the dense summary data or from the
+        sparse CIR file.
+
+        Args:
+            index: Link index (rx, rx_ant, tx, tx_ant)
+
+        Returns:
+            A tuple (a, tau) with the complex coefficients [num_paths, num_time_steps]
+            and the delays [num_paths] in ns
+        """
+        return self._cache.get(("cir", tuple(index)), lambda: self._cir_link(index))
+
+    def _cir_link(self, index) -> tuple:
+        if "cir_file" in self.json_data:
+            with self._state_lock:
+                sparse_cir, generation = self._sparse_cir, self._generation
+            if sparse_cir is None:
+                sparse_cir = self._store("_sparse_cir", rio.load_sparse_cir(
+                    str(self._parent.output_files_dir / self.json_data["cir_file"])), generation)
+            return rio.sparse_cir_link(sparse_cir, index)
+
+        ind1, ind2, ind3, ind4 = index
+        a_selected = self.json_data["a"][ind1][ind2][ind3][ind4]
+        a = np.array([[complex(d['real'], d['imag']) for d in p] for p in a_selected])
+        tau = self.json_data["tau"]
+        if np.ndim(tau) == 3:
+            # Synthetic array: [num_rx, num_tx, num_paths]
+            return a, np.array(tau[ind1][ind3])
+        return a, np.array(tau[ind1][ind2][ind3][ind4])
 
     def DoCheckInputConnections(self, inputs: list[xp.AlgorithmOutput]) -> bool:
         """
@@ -149,26 +389,88 @@ class SimulationExtractorImpl:
         Returns:
             True if the attributes were computed successfully
         """
-        num_outputs = 1
-        self._parent.ResizeNumberOfOutputPorts(num_outputs)
+        self._load_json_data(self._parent.output_files_dir / JSON_OUTPUT)
 
-        # Update attributes for all extractors
+        # One port per VTK file of the results, after the summary port
+        self._extractors = []
+        for filename in self.manifest.get("vtk_files", {}).values():
+            extractor = xp.VtkFieldImporter()
+            extractor.FileName = str(self._parent.output_files_dir / filename)
+            extractor.UpdateAttributes()
+            self._extractors.append(extractor)
 
-        self._load_json_data(self._parent.output_files_dir / JSON_OUTPUT)
+        num_outputs = len(self._extractors) + 1
+        self._parent.ResizeNumberOfOutputPorts(num_outputs)
 
         self._outputs = [None] * (num_outputs)
         self._update_outputs(child)
+        # Parse the summary before the first plot is requested
+        self.run_in_background("load", lambda: self.json_data, status="Loading results")
         return True
 
-    def define_child_properties(self,child,json_data):
+    def recompute_radio_map(self, power_dbm=None, bandwidth=None, temperature=None, active=None) -> dict:
+        """
+        Recomputes the RSS and SINR maps from the stored path gain.
+
+        Avoids a new ray tracing run when only the transmit powers, the noise
+        parameters or the set of active transmitters change. Parameters that
+        are not given keep the values stored in the summary.
+
+        Returns:
+            The updated summary data
+        """
+        with self._state_lock:
+            generation = self._generation
+        json_data = rm_utils.update_summary(self.json_data, power_dbm=power_dbm, bandwidth=bandwidth,
+                                            temperature=temperature, active=active)
+        with self._state_lock:
+            if generation != self._generation:
+                # Other results were loaded meanwhile
+                return json_data
+            self._json_data = json_data
+            self._cache.clear()
+        return json_data
+
+    def query_radio_map(self, points, metrics=rm_utils.METRICS) -> dict:
+        """
+        Interpolates the radio map at arbitrary positions.
+
+        Args:
+            points: Positions [num_points, 3]
+            metrics: Metrics to interpolate, out of "path_gain", "rss" and "sinr"
+
+        Returns:
+            Dictionary with the values [num_tx, num_points] of every metric
+        """
+        return rm_utils.query(self.json_data, points, metrics)
+
+    def link_statistics(self) -> dict:
+        """
+        Per-pair link statistics as flat columns, one entry per rx/tx pair,
+        with the power and the K-factor in dB and missing values as NaN.
+        """
+        stats = self.json_data["link_stats"]
+        num_rx, num_tx = np.shape(stats["total_power"])
+        columns = {"Receiver": np.repeat(np.arange(num_rx), num_tx), "Transmitter": np.tile(np.arange(num_tx), num_rx)}
+        for key, label, db in LINK_STATS.values():
+            values = np.array(stats[key], dtype=float).reshape(-1)
+            if db:
+                with np.errstate(divide="ignore"):
+                    values = 10*np.log10(values)
+            columns[label] = values
+        return columns
+
+    def define_child_properties(self,child,manifest):
 
         """
         Defines the GUI parameters that are going to be shown 
         in the AlgorithmImplementation child, depending on the 
-        type of solver used for the simulation
+        type of solver used for the simulation. Only the manifest
+        is used, the summary data is not loaded.
         """
 
-        plot_types =json_data["type"]
+        plot_types =manifest["type"]
+        entries = manifest["entries"]
 
         # Plots
         plots_group = child.add_property("plots", xc.PropertyGroup())
@@ -179,35 +481,66 @@ class SimulationExtractorImpl:
         if plot_types == "RadioMap":
             plots_group.Description = "RadioMap solver results"
             options = ["SINR", "Path gain", "RSS"]
-            options_tr = [f"Transmitter {e}" for e in np.linspace(0,np.array(json_data["sinr"]).shape[0], np.array(json_data["sinr"]).shape[0],dtype=int, endpoint=False)]
+            if "best_beam" in entries:
+                options += ["Best beam", "Best beam gain"]
+            if "kpi" in entries:
+                options += list(KPI_MAPS.keys()) + list(KPI_CDFS.keys())
+            options_tr = self.axis_labels("sinr", "tx")
             prop = plots_group.Add("ind", xc.PropertyEnum(options_tr,0))
             prop.Description = "Select transmitter"
             child.index_selector = prop
+            prop = plots_group.Add("map_pooling", xc.PropertyEnum(list(POOLING), 0))
+            prop.Description = "Pooling of large maps"
+            child.map_pooling_prop = prop
+
+            if "power_dbm" in manifest:
+                whatif_group = child.add_property("what_if", xc.PropertyGroup())
+                assert isinstance(whatif_group, xc.PropertyGroup)
+                whatif_group.Description = "What-if RSS/SINR"
+                prop = whatif_group.Add("power_dbm", xc.PropertyString(", ".join(str(p) for p in manifest["power_dbm"])))
+                prop.Description = "Power dBm (one or one per transmitter)"
+                child.whatif_power_prop = prop
+                prop = whatif_group.Add("active_tx", xc.PropertyString(""))
+                prop.Description = "Active transmitters (empty for all)"
+                child.whatif_active_prop = prop
+                prop = whatif_group.Add("bandwidth", xc.PropertyReal(manifest["bandwidth"]))
+                prop.Description = "Bandwidth"
+                child.whatif_bandwidth_prop = prop
+                prop = whatif_group.Add("temperature", xc.PropertyReal(manifest["temperature"]))
+                prop.Description = "Temperature"
+                child.whatif_temperature_prop = prop
+                prop = whatif_group.Add("recompute", xc.PropertyPushButton())
+                prop.Description = "Recompute RSS/SINR"
+                child.whatif_recompute_prop = prop
 
         else:
             try:
                 plots_group.Description = "Paths solver results"
                 options = ["Channel frequency response", "Channel Impulse response (histogram)", "Channel Impulse response", "Discrete channel taps"]
-                options_tr =[f"Transmitter {e}" for e in np.linspace(0,np.array(json_data["h_freq"]).shape[0], np.array(json_data["h_freq"]).shape[0],dtype=int, endpoint=False)]
-                prop = plots_group.Add("ind", xc.PropertyEnum(options_tr,0))
-                prop.Description = "Select transmitter"
+                if "beam_gain" in entries:
+                    options.append("Beam gain")
+                if "link_stats" in entries:
+                    options += ["Link statistics (table)", "Link statistics (CDF)"]
+                # The selectors index the CFR axes [rx, rx_ant, tx, tx_ant, time]
+                prop = plots_group.Add("ind", xc.PropertyEnum(self.axis_labels("h_freq", "rx"),0))
+                prop.Description = "Select receiver"
                 child.index_selector = prop
-                options_tr =[f"TX_ant {e}" for e in np.linspace(0,np.array(json_data["h_freq"]).shape[1], np.array(json_data["h_freq"]).shape[1],dtype=int, endpoint=False)]
-                prop = plots_group.Add("ind2", xc.PropertyEnum(options_tr,0))
-                prop.Description = "Select tx_ant"
+                prop = plots_group.Add("ind2", xc.PropertyEnum(self.axis_labels("h_freq", "rx_ant"),0))
+                prop.Description = "Select rx_ant"
                 child.index_selector2 = prop
-                options_tr =[f"Receiver {e}" for e in np.linspace(0,np.array(json_data["h_freq"]).shape[2], np.array(json_data["h_freq"]).shape[2],dtype=int, endpoint=False)]
-                prop = plots_group.Add("ind3", xc.PropertyEnum(options_tr,0))
-                prop.Description = "Select receiver"
+                prop = plots_group.Add("ind3", xc.PropertyEnum(self.axis_labels("h_freq", "tx"),0))
+                prop.Description = "Select transmitter"
                 child.index_selector3 = prop
-                options_tr =[f"RX_ant {e}" for e in np.linspace(0,np.array(json_data["h_freq"]).shape[3], np.array(json_data["h_freq"]).shape[3],dtype=int, endpoint=False)]
-                prop = plots_group.Add("ind4", xc.PropertyEnum(options_tr,0))
-                prop.Description = "Select rx_ant"
+                prop = plots_group.Add("ind4", xc.PropertyEnum(self.axis_labels("h_freq", "tx_ant"),0))
+                prop.Description = "Select tx_ant"
                 child.index_selector4 = prop
-                options_tr =[f"Timestep {e}" for e in np.linspace(0,np.array(json_data["h_freq"]).shape[4], np.array(json_data["h_freq"]).shape[4],dtype=int, endpoint=False)]
-                prop = plots_group.Add("ind5", xc.PropertyEnum(options_tr,0))
+                prop = plots_group.Add("ind5", xc.PropertyEnum(self.axis_labels("h_freq", "time"),0))
                 prop.Description = "Select time step"
                 child.index_selector5 = prop
+                if "link_stats" in entries:
+                    prop = plots_group.Add("link_stat", xc.PropertyEnum(list(LINK_STATS.keys()), 2))
+                    prop.Description = "Link statistic (table sorting, CDF)"
+                    child.link_stat_selector = prop
             except Exception as e:
                 logger.error(e)
             
@@ -226,10 +559,18 @@ class SimulationExtractorImpl:
         prop.Description = "Show Plot"
         child.show_plot_prop = prop
 
+        prop = plots_group.Add("image_preview", xc.PropertyBool(False))
+        prop.Description = "Downscaled image preview"
+        child.image_preview_prop = prop
+
         prop = plots_group.Add("show_image", xc.PropertyPushButton())
         prop.Description = "Show Image"
         child.show_image_prop = prop
 
+        prop = plots_group.Add("status", xc.PropertyString(""))
+        prop.Description = "Status"
+        self._status_prop = prop
+
         # connect not right away, but after the seriazliation
         asyncio.get_event_loop().call_soon(
             child._connect_signals
@@ -248,7 +589,11 @@ class SimulationExtractorImpl:
         # assert len(self.FIELD_NAMES) == num_outputs - 1
         assert len(self._outputs) == num_outputs
 
-        self.define_child_properties(child, self.json_data)
+        for i, extractor in enumerate(self._extractors):
+            extractor.Update()
+            self._outputs[i + 1] = extractor.GetOutput(0)
+
+        self.define_child_properties(child, self.manifest)
 
 
     def DoComputeOutputData(self, child, index: int) -> bool:
@@ -326,8 +671,16 @@ class AlgorithmImpl(IExtractorParent):
         self.index_selector3: xc.PropertyEnum = None
         self.index_selector4: xc.PropertyEnum = None
         self.index_selector5: xc.PropertyEnum = None
+        self.link_stat_selector: xc.PropertyEnum = None
+        self.map_pooling_prop: xc.PropertyEnum = None
         self.show_plot_prop: xc.PropertyPushButton = None
         self.show_image_prop: xc.PropertyPushButton = None
+        self.image_preview_prop: xc.PropertyBool = None
+        self.whatif_power_prop: xc.PropertyString = None
+        self.whatif_active_prop: xc.PropertyString = None
+        self.whatif_bandwidth_prop: xc.PropertyReal = None
+        self.whatif_temperature_prop: xc.PropertyReal = None
+        self.whatif_recompute_prop: xc.PropertyPushButton = None
 
         
         
@@ -340,108 +693,159 @@ class AlgorithmImpl(IExtractorParent):
         """
 
         def show_image():
-            plot_data = getattr(plots_functions, "generate_image")(self._extractor.json_data["image"], "Rendered scene")
-            ppm.create_plot(plot_data)
+            if self._extractor.manifest.get("image") is None:
+                logger.warning("No rendered image, the render was disabled in the solver settings")
+                return
+            max_size = IMAGE_PREVIEW_SIZE if self.image_preview_prop.Value else None
+            path = self._extractor.manifest["image"]
+            self._extractor.run_in_background(
+                "image", lambda: getattr(plots_functions, "generate_image")(path, "Rendered scene", max_size=max_size),
+                ppm.create_plot, status="Loading image")
 
         
-        def show_plot():
-            assert isinstance(self.plot_selector_prop, xc.PropertyEnum)
-            plot_name = self.plot_selector_prop.ValueDescription
-            if plot_name == "SINR":
-                tr_index = self.index_selector.Value
-                x = (np.linspace(0,np.array(np.array(self._extractor.json_data["sinr"])).shape[2], np.array(self._extractor.json_data["sinr"]).shape[2], dtype=int ))
-                y = (np.linspace(0,np.array(self._extractor.json_data["sinr"]).shape[1], np.array(self._extractor.json_data["sinr"]).shape[1], dtype=int ))
-                if self._extractor.json_data["db_scale"] == True:
-                    z_data = 10*log10(TensorXf(np.array(self._extractor.json_data["sinr"])[tr_index]))
-                    z_data = z_data.numpy()
-                    # Find the minimum value excluding -inf
-                    finite_min = np.min(z_data[np.isfinite(z_data)])
-                    # Replace -inf with (finite_min - 1)
-                    z_data = np.where(np.isneginf(z_data), finite_min - 1, z_data)
-                    plot_data = getattr(plots_functions, "generate_heatmap")(x,y,z_data, "SINR: Transmitter {}".format(tr_index), "Signal-to-interference-plus-noise ratio [dB]", vmin=self._extractor.json_data["vmin"], vmax=self._extractor.json_data["vmax"])
-                else:
-                    z_data = np.array(self._extractor.json_data["sinr"])[tr_index]
-                    plot_data = getattr(plots_functions, "generate_heatmap")(x,y,z_data, "SINR: Transmitter {}".format(tr_index), "Signal-to-interference-plus-noise ratio", vmin=self._extractor.json_data["vmin"], vmax=self._extractor.json_data["vmax"])
-            elif plot_name == "Path gain":
-                tr_index = self.index_selector.Value
-                x = (np.linspace(0,np.array(self._extractor.json_data["path_gain"]).shape[2], np.array(self._extractor.json_data["path_gain"]).shape[2], dtype=int ))
-                y = (np.linspace(0,np.array(self._extractor.json_data["path_gain"]).shape[1], np.array(self._extractor.json_data["path_gain"]).shape[1], dtype=int ))
-                if self._extractor.json_data["db_scale"] == True:
-                    z_data = 10*log10(TensorXf(np.array(self._extractor.json_data["path_gain"])[tr_index]))
-                    z_data = z_data.numpy()
-                    # Find the minimum value excluding -inf
-                    finite_min = np.min(z_data[np.isfinite(z_data)])
-                    # Replace -inf with (finite_min - 1)
-                    z_data = np.where(np.isneginf(z_data), finite_min - 1, z_data)
-                    plot_data = getattr(plots_functions, "generate_heatmap")(x,y,z_data, "Path gain: Transmitter {}".format(tr_index), "Path_gain [dB]", vmin=self._extractor.json_data["vmin"], vmax=self._extractor.json_data["vmax"])
-                else:
-                    z_data = np.array(self._extractor.json_data["path_gain"])[tr_index]
-                    plot_data = getattr(plots_functions, "generate_heatmap")(x,y,z_data, "Path gain: Transmitter {}".format(tr_index), "Path_gain", vmin=self._extractor.json_data["vmin"], vmax=self._extractor.json_data["vmax"])
-            elif plot_name == "RSS":
-                tr_index = self.index_selector.Value
-                x = (np.linspace(0,np.array(self._extractor.json_data["rss"]).shape[2], np.array(self._extractor.json_data["rss"]).shape[2], dtype=int ))
-                y = (np.linspace(0,np.array(self._extractor.json_data["rss"]).shape[1], np.array(self._extractor.json_data["rss"]).shape[1],dtype=int ))
-                if self._extractor.json_data["db_scale"] == True:
-                    z_data = watt_to_dbm(TensorXf(np.array(self._extractor.json_data["rss"])[tr_index]))
-                    z_data = z_data.numpy()
-                    # Find the minimum value excluding -inf
-                    finite_min = np.min(z_data[np.isfinite(z_data)])
-                    # Replace -inf with (finite_min - 1)
-                    z_data = np.where(np.isneginf(z_data), finite_min - 1, z_data)
-                    plot_data = getattr(plots_functions, "generate_heatmap")(x,y,z_data, "RSS: Transmitter {}".format(tr_index),"Received signal strength(RSS) [dBm]", vmin=self._extractor.json_data["vmin"], vmax=self._extractor.json_data["vmax"])
-                else:
-                    z_data = np.array(self._extractor.json_data["rss"])[tr_index]
-                    plot_data = getattr(plots_functions, "generate_heatmap")(x,y,z_data, "RSS: Transmitter {}".format(tr_index),"Received signal strength(RSS)", vmin=self._extractor.json_data["vmin"], vmax=self._extractor.json_data["vmax"])
+        def build_plot(plot_name, index, link_stat, pooling):
+            # Runs in the worker thread: no property access
+            if plot_name in RADIO_MAP_PLOTS:
+                key, short_name, label, unit = RADIO_MAP_PLOTS[plot_name]
+                tr_index = index[0]
+                db_scale = self._extractor.manifest["db_scale"] == True
+                z_data = self._extractor.radio_map_slice(key, tr_index, db_scale)
+                x = np.linspace(0, z_data.shape[1], z_data.shape[1], dtype=int)
+                y = np.linspace(0, z_data.shape[0], z_data.shape[0], dtype=int)
+                if db_scale:
+                    label = "{} [{}]".format(label, unit)
+                plot_data = getattr(plots_functions, "generate_heatmap")(x,y,z_data, "{}: Transmitter {}".format(short_name, tr_index), label, vmin=self._extractor.manifest["vmin"], vmax=self._extractor.manifest["vmax"], pooling=pooling)
+            elif plot_name == "Best beam":
+                tr_index = index[0]
+                z_data = self._extractor.array("best_beam")[tr_index]
+                x = np.arange(z_data.shape[1])
+                y = np.arange(z_data.shape[0])
+                plot_data = getattr(plots_functions, "generate_heatmap")(x,y,z_data, "Best beam: Transmitter {}".format(tr_index), "Beam index (-1: no coverage)", pooling=pooling)
+            elif plot_name == "Best beam gain":
+                tr_index = index[0]
+                z_data = 10*np.log10(self._extractor.array("best_beam_gain")[tr_index])
+                if np.any(np.isfinite(z_data)):
+                    # Cells without signal are shown below the smallest value
+                    z_data = np.where(np.isfinite(z_data), z_data, np.min(z_data[np.isfinite(z_data)]) - 1)
+                x = np.arange(z_data.shape[1])
+                y = np.arange(z_data.shape[0])
+                plot_data = getattr(plots_functions, "generate_heatmap")(x,y,z_data, "Best beam gain: Transmitter {}".format(tr_index), "Path gain [dB]", pooling=pooling)
+            elif plot_name in KPI_MAPS:
+                key, label = KPI_MAPS[plot_name]
+                z_data = np.array(self._extractor.json_data["kpi"][key], dtype=float)
+                if np.any(np.isfinite(z_data)):
+                    # Cells without signal are shown below the smallest value
+                    z_data = np.where(np.isfinite(z_data), z_data, np.min(z_data[np.isfinite(z_data)]) - 1)
+                x = np.arange(z_data.shape[1])
+                y = np.arange(z_data.shape[0])
+                plot_data = getattr(plots_functions, "generate_heatmap")(x,y,z_data, plot_name, label, pooling=pooling)
+            elif plot_name in KPI_CDFS:
+                key, label = KPI_CDFS[plot_name]
+                kpi = self._extractor.json_data["kpi"]
+                title = plot_name
+                if key == "best_sinr":
+                    title += ": coverage " + ", ".join(f"{100*c:.1f}% > {t:g} dB" for t, c in zip(kpi["thresholds_db"], kpi["coverage"]))
+                plot_data = getattr(plots_functions, "generate_cdf_plot")({plot_name: kpi["cdf"][key]}, title, label)
+            elif plot_name == "Beam gain":
+                ind1 = index[0]
+                ind3 = index[2]
+                gains = self._extractor.array("beam_gain")[ind1][ind3]
+                plot_data = getattr(plots_functions, "generate_discrete_scatter_plot")(gains, title="Beam gain: ({},{})".format(ind1,ind3), name="Beam gain", xaxis="Beam index", yaxis="Gain")
+            elif plot_name == "Link statistics (table)":
+                columns = self._extractor.link_statistics()
+                _, label, _ = LINK_STATS[link_stat]
+                # Largest values first, links without paths last
+                order = np.argsort(-np.nan_to_num(columns[label], nan=-np.inf, posinf=np.finfo(float).max), kind="stable")
+                columns = {k: [f"{v:.4g}" if np.isfinite(v) else "-" for v in np.asarray(c, dtype=float)[order]]
+                           for k, c in columns.items()}
+                plot_data = getattr(plots_functions, "generate_table")(columns, "Link statistics, sorted by {}".format(label))
+            elif plot_name == "Link statistics (CDF)":
+                _, label, _ = LINK_STATS[link_stat]
+                values = self._extractor.link_statistics()[label]
+                plot_data = getattr(plots_functions, "generate_cdf_plot")({label: rm_utils.cdf(values)}, "CDF over links: {}".format(label), label)
             elif plot_name =="Channel frequency response":
-                ind1 = self.index_selector.Value
-                ind2 = self.index_selector2.Value
-                ind3 = self.index_selector3.Value
-                ind4 = self.index_selector4.Value
-                ind5 = self.index_selector5.Value
-                plot_data = getattr(plots_functions, "generate_line_plot")(self._extractor.json_data["h_freq"][ind1][ind2][ind3][ind4][ind5], "Subcarrier index","|h_freq|", "Channel frequency response: ({},{},{},{})".format(ind1,ind2,ind3,ind4,ind5))
+                ind1 = index[0]
+                ind2 = index[1]
+                ind3 = index[2]
+                ind4 = index[3]
+                ind5 = index[4]
+                plot_data = getattr(plots_functions, "generate_line_plot")(np.abs(self._extractor.cfr_link((ind1, ind2, ind3, ind4, ind5))), "Subcarrier index","|h_freq|", "Channel frequency response: ({},{},{},{})".format(ind1,ind2,ind3,ind4,ind5))
             elif plot_name =="Discrete channel taps":
-                ind1 = self.index_selector.Value
-                ind2 = self.index_selector2.Value
-                ind3 = self.index_selector3.Value
-                ind4 = self.index_selector4.Value
-                ind5 = self.index_selector5.Value
+                ind1 = index[0]
+                ind2 = index[1]
+                ind3 = index[2]
+                ind4 = index[3]
+                ind5 = index[4]
                 taps_selected=self._extractor.json_data["taps"][ind1][ind2][ind3][ind4][ind5]
                 taps_complex = np.array([complex(d['real'], d['imag']) for d in taps_selected])
                 taps = np.abs(taps_complex)
                 plot_data = getattr(plots_functions, "generate_discrete_scatter_plot")(taps, title="Discrete channel taps: ({},{},{},{})".format(ind1,ind2,ind3,ind4,ind5))
             elif plot_name == "Channel Impulse response (histogram)":
-                ind1 = self.index_selector.Value
-                ind2 = self.index_selector2.Value
-                ind3 = self.index_selector3.Value
-                ind4 = self.index_selector4.Value
-                ind5 = self.index_selector5.Value
-                a_selected = self._extractor.json_data["a"][ind1][ind2][ind3][ind4]
-                a = [a[ind5] for a in a_selected]
-                a_complex = np.array([complex(d['real'], d['imag']) for d in a])
-                a_abs = np.abs(a_complex)
-                tau_selected = np.array(self._extractor.json_data["tau"][ind1][ind2][ind3][ind4])
+                ind1 = index[0]
+                ind2 = index[1]
+                ind3 = index[2]
+                ind4 = index[3]
+                ind5 = index[4]
+                a_selected, tau_selected = self._extractor.cir_link((ind1, ind2, ind3, ind4))
+                a_abs = np.abs(a_selected[:, ind5])
                 bins = np.linspace(tau_selected.min(), tau_selected.max(), 20)
                 hist, bin_edges = np.histogram(tau_selected, bins=bins, weights=a_abs)
                 plot_data = getattr(plots_functions, "generate_cir_binned_histogram")(bin_edges, hist, title="Binned Channel Impulse Response: ({},{},{},{})".format(ind1,ind2,ind3,ind4,ind5))
             elif plot_name == "Channel Impulse response":
-                ind1 = self.index_selector.Value
-                ind2 = self.index_selector2.Value
-                ind3 = self.index_selector3.Value
-                ind4 = self.index_selector4.Value
-                ind5 = self.index_selector5.Value
-                a_selected = self._extractor.json_data["a"][ind1][ind2][ind3][ind4]
-                a = [a[ind5] for a in a_selected]
-                a_complex = np.array([complex(d['real'], d['imag']) for d in a])
-                a_abs = np.abs(a_complex)
-                tau_selected = np.array(self._extractor.json_data["tau"][ind1][ind2][ind3][ind4])
+                ind1 = index[0]
+                ind2 = index[1]
+                ind3 = index[2]
+                ind4 = index[3]
+                ind5 = index[4]
+                a_selected, tau_selected = self._extractor.cir_link((ind1, ind2, ind3, ind4))
+                a_abs = np.abs(a_selected[:, ind5])
                 plot_data = getattr(plots_functions, "generate_discrete_scatter_plot")(a_abs, tau_selected, title="Binned Channel Impulse Response: ({},{},{},{})".format(ind1,ind2,ind3,ind4,ind5), name="tau vs a", xaxis="Tau [ns]", yaxis="|a|")
-            ppm.create_plot(plot_data)
+            return plot_data
+
+        def show_plot():
+            assert isinstance(self.plot_selector_prop, xc.PropertyEnum)
+            plot_name = self.plot_selector_prop.ValueDescription
+            # The selection is read here, in the UI thread
+            index = tuple(p.Value if p is not None else 0 for p in self._index_selectors())
+            link_stat = self.link_stat_selector.ValueDescription if self.link_stat_selector is not None else None
+            pooling = self.map_pooling_prop.ValueDescription if self.map_pooling_prop is not None else "max"
+            self._extractor.run_in_background("plot", lambda: build_plot(plot_name, index, link_stat, pooling),
+                                              ppm.create_plot, status=f"Building plot '{plot_name}'")
+
+        def selection_changed(prop: xc.Property, mod_type: xc.PropertyModificationTypeEnum):
+            # A plot of the previous selection is outdated
+            if mod_type == xc.kPropertyModified:
+                self._extractor.cancel("plot")
+
+        def recompute_radio_map():
+            try:
+                power_dbm = [float(p) for p in self.whatif_power_prop.Value.split(",") if p.strip()]
+                active = [int(i) for i in self.whatif_active_prop.Value.split(",") if i.strip()]
+                bandwidth = self.whatif_bandwidth_prop.Value
+                temperature = self.whatif_temperature_prop.Value
+                self._extractor.run_in_background(
+                    "recompute", lambda: self._extractor.recompute_radio_map(power_dbm=power_dbm,
+                                                                             bandwidth=bandwidth,
+                                                                             temperature=temperature,
+                                                                             active=active if len(active) != 0 else None),
+                    status="Recomputing RSS/SINR")
+            except Exception as e:
+                logger.error(e)
             
                 
         assert isinstance(self.show_plot_prop, xc.PropertyPushButton)
         self.show_plot_prop.OnClicked.Connect(show_plot)
         assert isinstance(self.show_image_prop, xc.PropertyPushButton)
         self.show_image_prop.OnClicked.Connect(show_image)
+        if self.whatif_recompute_prop is not None:
+            self.whatif_recompute_prop.OnClicked.Connect(recompute_radio_map)
+        for prop in (self.plot_selector_prop, *self._index_selectors(), self.link_stat_selector, self.map_pooling_prop):
+            if prop is not None:
+                prop.OnModified.Connect(selection_changed)
+
+    def _index_selectors(self) -> tuple:
+        return (self.index_selector, self.index_selector2, self.index_selector3, self.index_selector4,
+                self.index_selector5)
 
 
 
@@ -1,6 +1,9 @@
+import hashlib
 import importlib.util
 import inspect
 import logging
+import os
+import time
 from typing import Optional, Dict
 from sionna.rt import (
     PolarizedAntennaPattern,
@@ -11,14 +14,28 @@ from sionna.rt import (
     register_polarization_model,
 )
 
+from s4l_sionna_rt.solver.driver.pattern_lut import tabulated_factory, tabulated_scattering_factory
+
 logger = logging.getLogger(__name__)
 
 class SionnaLoader:
     """
     Dynamically loads and registers antenna pattern factories and
     scattering pattern classes from a user Python file.
+
+    Every file is executed once per process: modules are cached by path and
+    content hash, so the tx/rx patterns, polarization models and scattering
+    patterns of the same file share one module. Registrations of a name with
+    the object it already has are skipped.
     """
 
+    # (absolute path, content hash) -> module, shared by all loaders
+    _modules: Dict[tuple, object] = {}
+    # (kind, registered name) -> registered object
+    _registered: Dict[tuple, object] = {}
+    # (factory, *grid shape) -> tabulated factory
+    _tabulated: Dict[tuple, object] = {}
+
     def __init__(self, objs:Optional[Dict[str, float]] = None, module_path: Optional[str] = None):
         self.module_path = module_path
         if module_path!=None:
@@ -28,12 +45,38 @@ class SionnaLoader:
                 self.registrations = self.register_all(module_path)
 
     def _load_module(self, module_path):
-        spec = importlib.util.spec_from_file_location("user_patterns", module_path)
+        path = os.path.abspath(module_path)
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        key = (path, digest)
+        if key in self._modules:
+            return self._modules[key]
+
+        start = time.perf_counter()
+        spec = importlib.util.spec_from_file_location(f"user_patterns_{digest[:12]}", path)
         module = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(module)
+        self._modules[key] = module
+        logger.info(f"Loaded {path} in {time.perf_counter() - start:.3f} s")
         return module
 
-    def register_antenna_patterns(self, module_path, prefix="custom_"):
+    def _register(self, kind, register, name, obj):
+        """Registers `obj` under `name`, unless it is already registered"""
+        # Functions and classes compare by identity, slant angle lists by value
+        if (kind, name) in self._registered and self._registered[(kind, name)] == obj:
+            return
+        register(name, obj)
+        self._registered[(kind, name)] = obj
+        logger.debug(f"Registered {kind}: {name}")
+
+    def register_antenna_patterns(self, module_path, prefix="custom_", lut=None):
+        """
+        Registers the antenna pattern factories of a user file.
+
+        Args:
+            lut: Optional (num_theta, num_phi). The patterns are then tabulated
+                on this grid and registered as "<prefix><name>_lut<num_theta>x<num_phi>".
+        """
         module = self._load_module(module_path)
         factories = []
         for name, obj in inspect.getmembers(module):
@@ -46,9 +89,14 @@ class SionnaLoader:
                     and sig.return_annotation == PolarizedAntennaPattern
                 ):
                     # Optionally check return type annotation
+                    if lut is not None:
+                        num_theta, num_phi = int(lut[0]), int(lut[1])
+                        if (obj, num_theta, num_phi) not in self._tabulated:
+                            self._tabulated[(obj, num_theta, num_phi)] = tabulated_factory(obj, num_theta, num_phi)
+                        obj = self._tabulated[(obj, num_theta, num_phi)]
+                        name = f"{name}_lut{num_theta}x{num_phi}"
                     factories.append((name, obj))
-                    register_antenna_pattern(f"{prefix}{name}", obj)
-                    logger.debug(f"Registered antenna pattern: {prefix}{name}")
+                    self._register("antenna pattern", register_antenna_pattern, f"{prefix}{name}", obj)
         return [f"{prefix}{name}" for name, _ in factories]
 
     def register_polarizations(self,  objs, prefix="custom_"):
@@ -62,9 +110,8 @@ class SionnaLoader:
                 and all(isinstance(x, float) for x in obj)
             ):
                 reg_name = f"{prefix}{name}"
-                register_polarization(reg_name, obj)
+                self._register("polarization", register_polarization, reg_name, obj)
                 registered.append(reg_name)
-                logger.debug(f"Registered polarization: {reg_name}")
         return registered
 
     def register_polarization_models(self, module_path, prefix="custom_"):
@@ -75,12 +122,19 @@ class SionnaLoader:
                 sig = inspect.signature(obj)
                 if len(sig.parameters) != 4:
                     reg_name = f"{prefix}{name}"
-                    register_polarization_model(reg_name, obj)
+                    self._register("polarization model", register_polarization_model, reg_name, obj)
                     registered.append(reg_name)
-                    print(f"Registered polarization model: {reg_name}")
         return registered
 
-    def register_scattering_patterns(self, module_path, prefix="custom_"):
+    def register_scattering_patterns(self, module_path, prefix="custom_", lut=None):
+        """
+        Registers the scattering pattern classes of a user file.
+
+        Args:
+            lut: Optional (num_theta_i, num_theta_s, num_phi). The patterns are
+                then tabulated on this grid and registered as
+                "<prefix><name>_lut<num_theta_i>x<num_theta_s>x<num_phi>".
+        """
         module = self._load_module(module_path)
         classes = []
         for name, obj in inspect.getmembers(module):
@@ -91,9 +145,14 @@ class SionnaLoader:
             ):
                 # Optionally check for __call__ method
                 if hasattr(obj, "__call__"):
+                    if lut is not None:
+                        shape = tuple(int(n) for n in lut)
+                        if (obj,) + shape not in self._tabulated:
+                            self._tabulated[(obj,) + shape] = tabulated_scattering_factory(obj, *shape)
+                        obj = self._tabulated[(obj,) + shape]
+                        name = f"{name}_lut{shape[0]}x{shape[1]}x{shape[2]}"
                     classes.append((name, obj))
-                    register_scattering_pattern(f"{prefix}{name}", obj)
-                    logger.debug(f"Registered scattering pattern: {prefix}{name}")
+                    self._register("scattering pattern", register_scattering_pattern, f"{prefix}{name}", obj)
         return [f"{prefix}{name}" for name, _ in classes]
 
 
@@ -28,6 +28,18 @@ IMAGE_FILTERS = (
 
 PY_FILTERS = ("Python Files (*.py)|*.py|")
 
+CSV_FILTERS = ("CSV Files (*.csv;*.txt)|*.csv;*.txt|")
+
+POINTS_FILTERS = (
+    "CSV Files (*.csv;*.txt)|*.csv;*.txt|"
+    "NumPy Files (*.npy)|*.npy|"
+    )
+
+CODEBOOK_FILTERS = (
+    "NumPy Files (*.npy)|*.npy|"
+    "CSV Files (*.csv;*.txt)|*.csv;*.txt|"
+    )
+
 ITU_MATERIALS = ["concrete", "brick", "plasterboard", "wood", "glass", "ceiling_board", "chipboard", "plywood", "marble", "floorboard",  "metal", "very_dry_ground", "medium_dry_ground", "wet_ground"]
 SCATTERING_PATTERNS = ["lambertian", "directive", "backscattering", "custom"]
 SCATTERING_PATTERNS_CLASSES = [adp.Base(), adp.Base(), adp.Base(), adp.File(PY_FILTERS)]
@@ -61,6 +73,7 @@ class CustomMaterials:
     scattering_coefficient: adp.Real
     xpd_coefficient:adp.Real
     scattering_pattern: adp.Toggle
+    scattering_lut: adp.Vec3
 
 create_custom = lambda : CustomMaterials(
     thickness=adp.Real(0.1, name="Thickness"),
@@ -68,7 +81,8 @@ create_custom = lambda : CustomMaterials(
     conductivity=adp.Real(0.0, name="Conductivity"),
     scattering_coefficient = adp.Real(0.0, name="Scattering coefficient"),
     xpd_coefficient = adp.Real(0.0, name="XPD coefficient"),
-    scattering_pattern=adp.Toggle(SCATTERING_PATTERNS_CLASSES, SCATTERING_PATTERNS, SCATTERING_PATTERNS_PROPNAMES, name="Scattering pattern")
+    scattering_pattern=adp.Toggle(SCATTERING_PATTERNS_CLASSES, SCATTERING_PATTERNS, SCATTERING_PATTERNS_PROPNAMES, name="Scattering pattern"),
+    scattering_lut=adp.Vec3(0, 0, 0, name="Custom scattering LUT (theta_i, theta_s, phi samples; 0: off)"),
 )
 
 MATERIAL_TYPES = [create_ITU, create_custom]
@@ -152,6 +166,10 @@ class Sample_Positions:
     tx_association: adp.Boolean
     center_pos: adp.Boolean
     seed: adp.Integer
+    trace_paths: adp.Boolean
+    max_number_paths_per_src: adp.Integer
+    num_subcarriers: adp.Integer
+    subcarrier_spacing: adp.Real
 
 create_Sample_Positions = lambda:Sample_Positions(
     activate = adp.Boolean(False),
@@ -164,6 +182,124 @@ create_Sample_Positions = lambda:Sample_Positions(
     tx_association = adp.Boolean(True, name="Transmitter association"),
     center_pos = adp.Boolean(False, name="Center position"),
     seed =adp.Integer(1, name="Seed"),
+    trace_paths = adp.Boolean(False, name="Trace paths to sampled positions"),
+    max_number_paths_per_src = adp.Integer(1000000, name="Max # paths per source"),
+    num_subcarriers = adp.Integer(1024, name="Number of subcarriers"),
+    subcarrier_spacing = adp.Real(30e3, name="Subcarrier spacing"),
+)
+
+
+@dataclass_json
+@dataclass
+class Beam_Sweep:
+    activate: adp.Boolean
+    codebook: adp.Toggle
+
+create_Beam_Sweep = lambda:Beam_Sweep(
+    activate = adp.Boolean(False),
+    codebook = adp.Toggle([adp.Vec2(1,1), adp.File(CODEBOOK_FILTERS)], ["DFT", "custom"],
+                          ["Oversampling (vertical, horizontal):", "Select codebook file:"], name="Codebook"),
+)
+
+
+@dataclass_json
+@dataclass
+class Path_Pruning:
+    activate: adp.Boolean
+    threshold_db: adp.Real
+    top_k: adp.Integer
+
+create_Path_Pruning = lambda:Path_Pruning(
+    activate = adp.Boolean(False),
+    threshold_db = adp.Real(40, min=0, name="Threshold below strongest path [dB] (0: off)"),
+    top_k = adp.Integer(0, name="Max. paths per link (0: all)"),
+)
+
+
+@dataclass_json
+@dataclass
+class Time_Evolution:
+    activate: adp.Boolean
+    num_time_steps: adp.Integer
+    sampling_frequency: adp.Real
+
+create_Time_Evolution = lambda:Time_Evolution(
+    activate = adp.Boolean(False),
+    num_time_steps = adp.Integer(14, min=1, name="Number of time steps"),
+    sampling_frequency = adp.Real(1/1e-3, min=1e-6, name="Sampling frequency [Hz] (CIR, CFR and taps)"),
+)
+
+
+@dataclass_json
+@dataclass
+class Trajectory:
+    activate: adp.Boolean
+    waypoints: adp.Toggle
+    spacing: adp.Real
+    speed: adp.Real
+
+create_Trajectory = lambda:Trajectory(
+    activate = adp.Boolean(False),
+    waypoints = adp.Toggle([adp.String("0,0,1.5; 100,0,1.5"), adp.File(CSV_FILTERS)], ["polyline", "csv"],
+                           ["Waypoints (x,y,z; x,y,z; ...):", "Select waypoints file (t,x,y,z):"], name="Waypoints"),
+    spacing = adp.Real(1, min=0, name="Sample spacing [m] (0: waypoints only)"),
+    speed = adp.Real(0, min=0, name="Speed [m/s] (polyline, 0: static)"),
+)
+
+
+@dataclass_json
+@dataclass
+class Receiver_Set:
+    activate: adp.Boolean
+    source: adp.String
+    grid_center: adp.Vec3
+    grid_size: adp.Vec2
+    grid_spacing: adp.Vec2
+    grid_orientation: adp.Vec3
+    points_file: adp.File
+
+create_Receiver_Set = lambda:Receiver_Set(
+    activate = adp.Boolean(False),
+    source = adp.String("grid", True, ["grid", "file"], 0, name="Source"),
+    grid_center = adp.Vec3(0,0,1.5, name="Grid center"),
+    grid_size = adp.Vec2(100,100, name="Grid size"),
+    grid_spacing = adp.Vec2(10,10, name="Grid spacing"),
+    grid_orientation = adp.Vec3(0,0,0, name="Grid orientation"),
+    points_file = adp.File(POINTS_FILTERS, name="Points file (x,y,z)"),
+)
+
+
+@dataclass_json
+@dataclass
+class Dataset:
+    activate: adp.Boolean
+    num_samples: adp.Integer
+    shard_size: adp.Integer
+    sampling: adp.String
+    region_center: adp.Vec3
+    region_size: adp.Vec3
+    cell_size: adp.Vec2
+    metric: adp.String
+    min_val_db: adp.Real
+    max_val_db: adp.Real
+    format: adp.String
+    folder: adp.String
+    seed: adp.Integer
+
+create_Dataset = lambda:Dataset(
+    activate = adp.Boolean(False),
+    num_samples = adp.Integer(100000, name="Number of samples"),
+    shard_size = adp.Integer(1000, min=1, name="Samples per shard"),
+    sampling = adp.String("uniform", True, ["uniform", "radio_map"], 0, name="Sampling"),
+    region_center = adp.Vec3(0,0,1.5, name="Region center"),
+    region_size = adp.Vec3(400,400,0, name="Region size"),
+    cell_size = adp.Vec2(5,5, name="Radio map cell size"),
+    metric = adp.String("path_gain", True, ["path_gain", "rss", "sinr"], 0, name="Sampling metric"),
+    min_val_db = adp.Real(-130, name="Min. dB value"),
+    max_val_db = adp.Real(200, name="Max. dB value"),
+    format = adp.String("npz", True, ["npz", "tfrecord"], 0, name="Shard format"),
+    folder = adp.String("", name="Output folder (empty: results folder)"),
+    seed = adp.Integer(1, name="Seed"),
 )
 
 
@@ -249,6 +385,17 @@ class Path:
     normalize_energy:adp.Boolean
     normalize_delays:adp.Boolean
     sampling_frequency:adp.Toggle
+    frozen_paths:adp.Boolean
+    beam_sweep:adp.Beam_Sweep
+    sparse_cir:adp.Boolean
+    export_paths:adp.Boolean
+    render_image:adp.Boolean
+    pruning:adp.Path_Pruning
+    cfr_memory_budget:adp.Real
+    time_evolution:adp.Time_Evolution
+    trajectory:adp.Trajectory
+    receiver_set:adp.Receiver_Set
+    dataset:adp.Dataset
 
 create_Path = lambda : Path(
     max_depth = adp.Integer(10,name="Max depth"),
@@ -267,7 +414,18 @@ create_Path = lambda : Path(
     l_max = adp.Real(100, name="Maximum time lag"),
     normalize_energy = adp.Boolean(True, name= "Normalize energy"),
     normalize_delays = adp.Boolean(True, name = "Normalize delays"),
-    sampling_frequency=adp.Toggle([adp.Base(), adp.Real(1/100e6)], ["Nyquist", "Custom"], name="Sampling frequency")
+    sampling_frequency=adp.Toggle([adp.Base(), adp.Real(1/100e6)], ["Nyquist", "Custom"], name="Sampling frequency"),
+    frozen_paths = adp.Boolean(False, name="Store frozen paths"),
+    beam_sweep = adp.Beam_Sweep(name="Beam sweep"),
+    sparse_cir = adp.Boolean(False, name="Sparse CIR storage"),
+    export_paths = adp.Boolean(False, name="Export paths (VTK)"),
+    render_image = adp.Boolean(True, name="Render image"),
+    pruning = adp.Path_Pruning(name="Path pruning"),
+    cfr_memory_budget = adp.Real(0, min=0, name="CFR memory budget [MB] (0: unlimited)"),
+    time_evolution = adp.Time_Evolution(name="Time evolution (Doppler)"),
+    trajectory = adp.Trajectory(name="Receiver trajectory"),
+    receiver_set = adp.Receiver_Set(name="Receiver set (grid or point file)"),
+    dataset = adp.Dataset(name="Channel dataset"),
 )
 
 
@@ -292,6 +450,11 @@ class RadioMap:
     resizing: adp.Resizing
     rescaling: adp.Rescaling
     sample_positions:adp.Sample_Positions
+    cache: adp.Boolean
+    cache_folder: adp.String
+    cache_max_size: adp.Real
+    beam_sweep: adp.Beam_Sweep
+    coverage_thresholds: adp.String
     
 
 create_RadioMap = lambda : RadioMap(
@@ -312,7 +475,11 @@ create_RadioMap = lambda : RadioMap(
     resizing=adp.Resizing(name="Resizing"),
     rescaling=adp.Rescaling(name="Rescaling"),
     sample_positions=adp.Sample_Positions(name="Sample positions"),
-    
+    cache=adp.Boolean(False, name="Per-transmitter cache"),
+    cache_folder=adp.String("", name="Cache folder (empty: results folder)"),
+    cache_max_size=adp.Real(1024, min=0, name="Cache size limit [MB] (0: unlimited)"),
+    beam_sweep=adp.Beam_Sweep(name="Beam sweep"),
+    coverage_thresholds=adp.String("-5, 0, 5, 10", name="Coverage SINR thresholds [dB]"),
 )
 
 SOLVERS = [create_RadioMap, create_Path]
@@ -338,6 +505,7 @@ class AntennaArray:
     pattern:adp.Toggle
     polarization:adp.Toggle
     polarization_model:adp.Toggle
+    pattern_lut:adp.Vec2
 
 create_AntennaArray = lambda : AntennaArray(
     num_rows=adp.Integer(1, name="Number of rows"),
@@ -347,6 +515,7 @@ create_AntennaArray = lambda : AntennaArray(
     pattern = adp.Toggle(ANTENNA_PATTERNS_CLASSES, ANTENNA_PATTERNS, ANTENNA_PATTERNS_PROPNAMES, name="Pattern"),
     polarization=adp.Toggle(POLARIZATION_CLASSES, POLARIZATION, POLARIZATION_PROPNAMES, name="Polarization"),
     polarization_model=adp.Toggle(POLARIZATION_MODEL_CLASSES, POLARIZATION_MODEL, POLARIZATION_MODEL_PROPNAMES, name="Polarization model"),
+    pattern_lut=adp.Vec2(0, 0, name="Custom pattern LUT (theta, phi samples; 0: off)"),
 )
 
 
@@ -373,3 +542,14 @@ class Simulations(BaseSimulations):
     executed as a batch.
     """
     simulations: list[SimulationOutput]  # List of individual simulation configurations
+
+
+def settings_group(settings: dict, name: str, create) -> dict:
+    """
+    Settings group `name` of the solver settings, completed with the Boolean,
+    Integer and Real defaults of its `create` factory, since input files
+    written by older versions of the plugin lack the groups added since.
+    """
+    defaults = {k: p.value for k, p in create().__dict__.items()
+                if isinstance(p, (adp.Boolean, adp.Integer, adp.Real))}
+    return {**defaults, **settings.get(name, {})}
@@ -0,0 +1,170 @@
+"""
+Precoding codebooks and their batched evaluation.
+
+A codebook is a complex array of shape [num_beams, num_tx_ant] whose rows are
+unit-norm precoding vectors p. The equivalent SISO coefficient of a channel
+vector h is h^H p. The Sionna RadioMapSolver computes h^T p instead, so the
+conjugated codebook must be passed as its `precoding_vec` for radio maps and
+paths to use the same beams. The transmit antennas are ordered as in
+Sionna: polarization (pattern) first, then array element, with the elements of
+a PlanarArray numbered column by column.
+"""
+
+import logging
+from typing import Optional
+
+import numpy as np
+
+from s4l_sionna_rt.solver.driver import channel_utils as ch
+
+logger = logging.getLogger(__name__)
+
+def dft_codebook(num_rows: int, num_cols: int, vertical_spacing: float = 0.5, horizontal_spacing: float = 0.5,
+                 num_patterns: int = 1, oversampling=(1, 1)):
+    """
+    Two-dimensional DFT beams of a planar array.
+
+    Args:
+        num_rows: Number of rows of the array
+        num_cols: Number of columns of the array
+        vertical_spacing: Vertical element spacing [wavelengths]
+        horizontal_spacing: Horizontal element spacing [wavelengths]
+        num_patterns: Number of antenna patterns (polarizations) per element.
+            Every polarization gets the same weights.
+        oversampling: Oversampling factors (vertical, horizontal)
+
+    Returns:
+        A tuple (codebook, directions) with the codebook [num_beams, num_tx_ant]
+        and the direction cosines (v, u) = (cos(theta), sin(theta)sin(phi)) of
+        every beam in the array frame [num_beams, 2]
+    """
+    os_v, os_h = int(oversampling[0]), int(oversampling[1])
+    # Centered DFT spatial frequencies, in cycles per element
+    f_v = np.arange(num_rows*os_v)/(num_rows*os_v) - 0.5*(num_rows > 1)
+    f_h = np.arange(num_cols*os_h)/(num_cols*os_h) - 0.5*(num_cols > 1)
+    f_v, f_h = [f.reshape(-1) for f in np.meshgrid(f_v, f_h, indexing="ij")]
+
+    # Element positions as in sionna.rt.PlanarArray [wavelengths]
+    i, j = np.meshgrid(np.arange(num_rows), np.arange(num_cols), indexing="ij")
+    i, j = i.T.reshape(-1), j.T.reshape(-1)
+    y = (j - (num_cols - 1)/2)*horizontal_spacing
+    z = (-i + (num_rows - 1)/2)*vertical_spacing
+
+    u = f_h/horizontal_spacing
+    v = f_v/vertical_spacing
+    w = np.exp(2j*np.pi*(u[:, None]*y + v[:, None]*z))
+    w = np.tile(w, (1, num_patterns))
+    w /= np.sqrt(w.shape[1])
+    return w.astype(np.complex64), np.stack([v, u], axis=-1).astype(np.float32)
+
+
+def load_codebook(filename: str) -> np.ndarray:
+    """
+    Loads user-supplied precoding vectors.
+
+    Supported formats are .npy files with a complex array, and text files
+    with one beam per line and complex values such as ``1+0j`` separated by
+    commas. Every vector is normalized to unit norm.
+    """
+    if filename.endswith(".npy"):
+        w = np.load(filename)
+    else:
+        w = np.loadtxt(filename, delimiter=",", dtype=complex, ndmin=2)
+    w = np.atleast_2d(w).astype(np.complex64)
+    norm = np.linalg.norm(w, axis=1, keepdims=True)
+    return w/np.where(norm == 0, 1, norm)
+
+
+def codebook_from_settings(settings: dict, tx_array: dict, num_patterns: int) -> np.ndarray:
+    """
+    Builds the codebook of the beam sweep settings of a solver.
+
+    Args:
+        settings: Beam sweep settings from the input file
+        tx_array: Transmitter array settings from the input file
+        num_patterns: Number of antenna patterns of the transmitter array
+    """
+    codebook = settings["codebook"]
+    if "custom" in codebook:
+        w = load_codebook(codebook["custom"])
+        num_tx_ant = num_patterns*tx_array["num_rows"]*tx_array["num_cols"]
+        if w.shape[1] != num_tx_ant:
+            raise ValueError(f"Codebook has {w.shape[1]} antennas, the transmitter array has {num_tx_ant}")
+        return w
+    w, _ = dft_codebook(tx_array["num_rows"], tx_array["num_cols"], tx_array["vertical_spacing"],
+                        tx_array["horizontal_spacing"], num_patterns, codebook["DFT"])
+    return w
+
+
+def apply_precoding(a: np.ndarray, codebook: np.ndarray) -> np.ndarray:
+    """
+    Applies all precoding vectors to channel coefficients in one operation.
+
+    Args:
+        a: Coefficients [num_rx, num_rx_ant, num_tx, num_tx_ant, ...], e.g.,
+            path coefficients or a CFR
+        codebook: Precoding vectors [num_beams, num_tx_ant]
+
+    Returns:
+        Coefficients with the transmit antenna axis replaced by the beams
+        [num_rx, num_rx_ant, num_tx, num_beams, ...]
+    """
+    if a.shape[3] != codebook.shape[1]:
+        raise ValueError(f"Codebook has {codebook.shape[1]} antennas, the channel has {a.shape[3]}")
+    return np.einsum("rxtk...,bk->rxtb...", a, np.conj(codebook))
+
+
+def beam_gains(h_freq: np.ndarray, codebook: np.ndarray) -> np.ndarray:
+    """
+    Average beamforming gain of every beam and link.
+
+    Args:
+        h_freq: Channel frequency response
+            [num_rx, num_rx_ant, num_tx, num_tx_ant, num_time_steps, num_subcarriers]
+        codebook: Precoding vectors [num_beams, num_tx_ant]
+
+    Returns:
+        Gain averaged over receive antennas, time steps and subcarriers
+        [num_rx, num_tx, num_beams]
+    """
+    h = apply_precoding(h_freq, codebook)
+    return np.mean(np.abs(h)**2, axis=(1, 4, 5))
+
+
+def beam_gains_chunked(a_b: np.ndarray, tau: np.ndarray, frequencies: np.ndarray, codebook: np.ndarray,
+                       max_bytes: float = 256*2**20) -> np.ndarray:
+    """
+    Same as beam_gains(), with the CFR computed in blocks of subcarriers so
+    that neither the CFR nor the precoded CFR has to fit in memory.
+
+    Args:
+        a_b: Baseband coefficients returned by channel_utils.baseband_cir()
+        tau: Delays returned by channel_utils.baseband_cir()
+        frequencies: Baseband frequencies [Hz]
+        codebook: Precoding vectors [num_beams, num_tx_ant]
+        max_bytes: Memory budget of one block [bytes]
+
+    Returns:
+        Gain averaged over receive antennas, time steps and subcarriers
+        [num_rx, num_tx, num_beams]
+    """
+    frequencies = np.asarray(frequencies)
+    # The precoded block is larger than the CFR block if there are more beams than antennas
+    step = ch.cfr_chunk_size(a_b, tau, max_bytes*codebook.shape[1]/max(codebook.shape))
+    total = 0.
+    for start in range(0, len(frequencies), step):
+        h = apply_precoding(ch.cfr(a_b, tau, frequencies[start:start + step]), codebook)
+        total = total + np.sum(np.abs(h)**2, axis=(1, 4, 5))
+    return total/(a_b.shape[1]*a_b.shape[-1]*len(frequencies))
+
+
+def best_beam(gains: np.ndarray, axis: int = -1, min_gain: Optional[float] = 0.):
+    """
+    Index and gain of the best beam along `axis`. Entries where no beam
+    exceeds `min_gain` get the index -1.
+    """
+    index = np.argmax(gains, axis=axis)
+    gain = np.max(gains, axis=axis)
+    if min_gain is not None:
+        index = np.where(gain > min_gain, index, -1)
+    return index, gain
@@ -0,0 +1,337 @@
+"""
+NumPy implementation of the channel responses computed by Sionna RT Paths.
+
+These functions reproduce Paths.cir(), Paths.cfr() and Paths.taps() from
+passband path coefficients and delays, so that the channels can be derived
+from stored or modified path data without the solver. Shapes follow the Sionna
+conventions:
+
+    a:   [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths]
+    tau: [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths]
+         or [num_rx, num_tx, num_paths] for synthetic arrays
+
+Invalid paths have a zero coefficient and a delay of -1.
+"""
+
+import logging
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def subcarrier_frequencies(num_subcarriers: int, subcarrier_spacing: float) -> np.ndarray:
+    """Baseband frequencies of the subcarriers, as sionna.rt.subcarrier_frequencies"""
+    if num_subcarriers % 2 == 0:
+        start, limit = -num_subcarriers//2, num_subcarriers//2
+    else:
+        start, limit = -(num_subcarriers - 1)//2, (num_subcarriers - 1)//2 + 1
+    return np.arange(start, limit, dtype=np.float64)*subcarrier_spacing
+
+
+def expand_tau(tau: np.ndarray) -> np.ndarray:
+    """Reshapes synthetic-array delays [num_rx, num_tx, num_paths] to the rank of `a`"""
+    if tau.ndim == 3:
+        return tau[:, None, :, None, :]
+    return tau
+
+
+def normalize_path_delays(tau: np.ndarray) -> np.ndarray:
+    """
+    Shifts the delays so that the first path of every link arrives at zero.
+    Invalid paths keep a delay of -1.
+    """
+    invalid = tau < 0
+    tau_ = np.where(invalid, np.inf, tau)
+    if tau.ndim == 3:
+        min_tau = np.min(tau_, axis=-1, keepdims=True)
+    else:
+        min_tau = np.min(tau_, axis=(1, 3, 4), keepdims=True)
+    tau_ = tau_ - min_tau
+    return np.where(invalid | ~np.isfinite(tau_), -1., tau_)
+
+
+def baseband_cir(a: np.ndarray, tau: np.ndarray, frequency: float, normalize_delays: bool = True,
+                 doppler: Optional[np.ndarray] = None, num_time_steps: int = 1,
+                 sampling_frequency: float = 1.):
+    """
+    Baseband-equivalent channel impulse response, as Paths.cir().
+
+    Args:
+        a: Passband path coefficients
+        tau: Path delays [s]
+        frequency: Carrier frequency [Hz]
+        normalize_delays: Normalize the delays of every link to start at zero
+        doppler: Doppler shift of every path [Hz], same shape as `tau`.
+            Only required if `num_time_steps` > 1.
+        num_time_steps: Number of time steps
+        sampling_frequency: Frequency [Hz] at which the time steps are sampled
+
+    Returns:
+        A tuple (a_b, tau) with a_b of shape
+        [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths, num_time_steps]
+    """
+    if normalize_delays:
+        tau = normalize_path_delays(tau)
+    tau_ = expand_tau(np.where(tau < 0, 0., tau))
+    a_b = a*np.exp(-2j*np.pi*frequency*tau_)
+    a_b = a_b[..., None]
+
+    if num_time_steps > 1:
+        t = np.arange(num_time_steps)/sampling_frequency
+        a_b = a_b*np.exp(2j*np.pi*expand_tau(doppler)[..., None]*t)
+
+    return a_b.astype(np.complex64), tau
+
+
+def cfr(a_b: np.ndarray, tau: np.ndarray, frequencies: np.ndarray, normalize: bool = False) -> np.ndarray:
+    """
+    Channel frequency response, as Paths.cfr().
+
+    Args:
+        a_b: Baseband coefficients returned by baseband_cir()
+        tau: Delays returned by baseband_cir()
+        frequencies: Baseband frequencies [Hz]
+        normalize: Normalize every link to unit average energy
+
+    Returns:
+        CFR of shape [num_rx, num_rx_ant, num_tx, num_tx_ant, num_time_steps, num_frequencies]
+    """
+    tau_ = expand_tau(tau)
+    # [..., num_paths, num_frequencies]
+    e = np.exp(-2j*np.pi*tau_[..., None]*np.asarray(frequencies)).astype(np.complex64)
+    h_f = np.einsum("...pt,...pf->...tf", a_b, e)
+
+    if normalize:
+        c = np.sqrt(np.mean(np.abs(h_f)**2, axis=(1, 3, 4, 5), keepdims=True))
+        h_f = np.where(c == 0, 0, h_f/np.where(c == 0, 1, c))
+    return h_f.astype(np.complex64)
+
+
+def cfr_chunk_size(a_b: np.ndarray, tau: np.ndarray, max_bytes: float) -> int:
+    """Number of subcarriers per block such that computing one block needs about `max_bytes`"""
+    # Output and phase terms of one subcarrier, twice for the einsum temporaries
+    bytes_per_subcarrier = 2*np.dtype(np.complex64).itemsize*(a_b[..., 0, :].size + expand_tau(tau).size)
+    return max(1, int(max_bytes//bytes_per_subcarrier))
+
+
+def cfr_chunked(a_b: np.ndarray, tau: np.ndarray, frequencies: np.ndarray, out: np.ndarray,
+                normalize: bool = False, max_bytes: float = 256*2**20) -> np.ndarray:
+    """
+    Channel frequency response computed in blocks of subcarriers.
+
+    Every block is written to `out` as soon as it is computed, so that `out`
+    can be a memory-mapped array on disk and the CFR never has to fit in
+    memory. Normalization needs the energy of every link over all
+    subcarriers and is applied in a second pass over the blocks.
+
+    Args:
+        a_b: Baseband coefficients returned by baseband_cir()
+        tau: Delays returned by baseband_cir()
+        frequencies: Baseband frequencies [Hz]
+        out: Preallocated output
+            [num_rx, num_rx_ant, num_tx, num_tx_ant, num_time_steps, num_frequencies]
+        normalize: Normalize every link to unit average energy
+        max_bytes: Memory budget of one block [bytes]
+
+    Returns:
+        `out`
+    """
+    frequencies = np.asarray(frequencies)
+    step = cfr_chunk_size(a_b, tau, max_bytes)
+    blocks = [slice(start, start + step) for start in range(0, len(frequencies), step)]
+    logger.info(f"CFR: {len(frequencies)} subcarriers in {len(blocks)} blocks of up to {step}")
+
+    energy = 0.
+    for block in blocks:
+        h_f = cfr(a_b, tau, frequencies[block])
+        out[..., block] = h_f
+        if normalize:
+            energy = energy + np.sum(np.abs(h_f)**2, axis=(1, 3, 4, 5), keepdims=True)
+
+    if normalize:
+        count = out.shape[1]*out.shape[3]*out.shape[4]*out.shape[5]
+        c = np.sqrt(energy/count)
+        for block in blocks:
+            out[..., block] = np.where(c == 0, 0, out[..., block]/np.where(c == 0, 1, c))
+    return out
+
+
+def taps(a_b: np.ndarray, tau: np.ndarray, bandwidth: float, l_min: int, l_max: int,
+         normalize: bool = False) -> np.ndarray:
+    """
+    Discrete baseband channel taps, as Paths.taps().
+
+    Args:
+        a_b: Baseband coefficients returned by baseband_cir(), sampled at
+            the taps sampling frequency
+        tau: Delays returned by baseband_cir()
+        bandwidth: Bandwidth [Hz] to which the channel is low-pass filtered
+        l_min: Smallest time lag
+        l_max: Largest time lag
+        normalize: Normalize every link to unit average energy
+
+    Returns:
+        Taps of shape [num_rx, num_rx_ant, num_tx, num_tx_ant, num_time_steps, l_max - l_min + 1]
+    """
+    l = np.arange(int(l_min), int(l_max) + 1)
+    # [..., num_paths, num_taps]
+    g = np.sinc(l - expand_tau(tau)[..., None]*bandwidth).astype(np.float32)
+    h = np.einsum("...pt,...pl->...tl", a_b, g)
+
+    if normalize:
+        c = np.mean(np.sum(np.abs(h)**2, axis=-1, keepdims=True), axis=(1, 3, 4), keepdims=True)
+        h = np.where(c == 0, 0, h/np.sqrt(np.where(c == 0, 1, c)))
+    return h.astype(np.complex64)
+
+
+def prune_paths(a: np.ndarray, tau: np.ndarray, threshold_db: Optional[float] = None,
+                top_k: Optional[int] = None, extra: tuple = ()):
+    """
+    Drops weak paths before the channel computations.
+
+    A path is kept if its power is at most `threshold_db` below the strongest
+    path of its link and if it is among the `top_k` strongest paths of its
+    link. For synthetic arrays, the power of a path is summed over all antenna
+    pairs, so that all antennas keep the same paths. The kept paths are moved
+    to the front of the path axis, which is truncated to the largest number of
+    kept paths of any link.
+
+    Args:
+        a: Passband path coefficients [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths]
+        tau: Path delays, with the shape of `a` or [num_rx, num_tx, num_paths]
+        threshold_db: Largest power difference to the strongest path [dB].
+            None disables the threshold.
+        top_k: Largest number of paths per link. None disables the limit.
+        extra: Further per-path arrays with the shape of `tau`, e.g., the
+            Doppler shifts, pruned in the same way
+
+    Returns:
+        A tuple (a, tau, extra, stats) where stats records the number of
+        paths and the pruned fraction of the energy of every link
+    """
+    power = np.abs(a)**2
+    if tau.ndim == 3:
+        power = np.sum(power, axis=(1, 3))
+    valid = tau >= 0
+    power = np.where(valid, power, 0.)
+
+    keep = valid
+    if threshold_db is not None:
+        max_power = np.max(power, axis=-1, keepdims=True)
+        keep = keep & (power >= max_power*10**(-threshold_db/10))
+    if top_k is not None:
+        # Rank of every path within its link, strongest first
+        rank = np.argsort(np.argsort(-np.where(keep, power, -1.), axis=-1, kind="stable"), axis=-1)
+        keep = keep & (rank < top_k)
+
+    total = np.sum(power, axis=-1)
+    pruned = total - np.sum(np.where(keep, power, 0.), axis=-1)
+
+    # Move the kept paths to the front and drop the empty path slots
+    order = np.argsort(~keep, axis=-1, kind="stable")
+    num_kept = int(np.max(np.sum(keep, axis=-1), initial=0))
+    order = order[..., :num_kept]
+    keep = np.take_along_axis(keep, order, axis=-1)
+    tau = np.where(keep, np.take_along_axis(tau, order, axis=-1), -1.)
+    extra = tuple(np.where(keep, np.take_along_axis(e, order, axis=-1), 0.) for e in extra)
+    order_a = np.broadcast_to(expand_tau(order), a.shape[:-1] + (num_kept,))
+    a = np.where(np.broadcast_to(expand_tau(keep), order_a.shape), np.take_along_axis(a, order_a, axis=-1), 0)
+
+    stats = {
+        "num_paths_before": int(valid.shape[-1]),
+        "num_paths_after": num_kept,
+        "num_valid_paths_before": int(np.sum(valid)),
+        "num_valid_paths_after": int(np.sum(keep)),
+        "pruned_energy_fraction": np.where(total > 0, pruned/np.where(total > 0, total, 1.), 0.),
+        "total_pruned_energy_fraction": float(np.sum(pruned)/np.sum(total)) if np.sum(total) > 0 else 0.,
+    }
+    return a, tau, extra, stats
+
+
+def link_statistics(a: np.ndarray, tau: np.ndarray, significance_db: float = 30.) -> dict:
+    """
+    Delay and power statistics of every transmitter-receiver pair.
+
+    The power delay profile of a pair pools the paths of all its antenna
+    pairs, with the path powers averaged over the antenna pairs and the time
+    steps. Delays are taken relative to the first path of the pair.
+
+    Args:
+        a: Path coefficients [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths(, num_time_steps)]
+        tau: Path delays, with the shape of `a` without time steps or
+            [num_rx, num_tx, num_paths]
+        significance_db: A path is significant if its power is at most
+            `significance_db` below the strongest path of the pair [dB]
+
+    Returns:
+        Dictionary of arrays [num_rx, num_tx] with the ``total_power`` (sum of
+        the path gains), ``mean_excess_delay`` and ``rms_delay_spread`` in the
+        unit of `tau`, the Rician ``k_factor`` (strongest path over all other
+        paths, inf for a single path) and ``num_significant_paths``
+    """
+    if a.ndim == 6:
+        power = np.mean(np.abs(a)**2, axis=-1)
+    else:
+        power = np.abs(a)**2
+    tau = np.broadcast_to(expand_tau(tau), power.shape)
+    num_ant = power.shape[1]*power.shape[3]
+    power = np.where(tau >= 0, power, 0.)
+
+    # [num_rx, num_tx, num_rx_ant*num_tx_ant*num_paths]
+    power = np.moveaxis(power, 2, 1).reshape(power.shape[0], power.shape[2], -1)/num_ant
+    tau = np.moveaxis(tau, 2, 1).reshape(power.shape)
+    valid = power > 0
+    tau = tau - np.min(np.where(valid, tau, np.inf), axis=-1, keepdims=True, initial=np.inf)
+    tau = np.where(valid, tau, 0.)
+
+    total = np.sum(power, axis=-1)
+    norm = np.where(total > 0, total, 1.)
+    mean_delay = np.sum(power*tau, axis=-1)/norm
+    rms = np.sqrt(np.maximum(np.sum(power*tau**2, axis=-1)/norm - mean_delay**2, 0.))
+
+    strongest = np.max(power, axis=-1, initial=0.)
+    scattered = total - strongest
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k_factor = np.where(scattered > 0, strongest/np.where(scattered > 0, scattered, 1.), np.inf)
+    significant = valid & (power >= strongest[..., None]*10**(-significance_db/10))
+
+    no_paths = total == 0
+    return {"total_power": total,
+            "mean_excess_delay": np.where(no_paths, np.nan, mean_delay),
+            "rms_delay_spread": np.where(no_paths, np.nan, rms),
+            "k_factor": np.where(no_paths, np.nan, k_factor),
+            "num_significant_paths": np.sum(significant, axis=-1)}
+
+
+def compute_channels(a: np.ndarray, tau: np.ndarray, frequency: float, solver_settings: dict,
+                     cfr_out: Optional[np.ndarray] = None, max_bytes: Optional[float] = None,
+                     doppler: Optional[np.ndarray] = None, num_time_steps: int = 1,
+                     sampling_frequency: float = 1.) -> dict:
+    """
+    Computes the CIR, CFR and taps of the Path solver outputs from passband
+    coefficients, using the channel settings of the Path solver.
+
+    If `cfr_out` is given, the CFR is computed in subcarrier blocks of at
+    most `max_bytes` and written to it. With `num_time_steps` > 1, the
+    channels evolve over time according to the Doppler shifts `doppler`,
+    sampled at `sampling_frequency`.
+
+    Returns:
+        Dictionary with the baseband `a`, the normalized `tau` [s], `h_freq` and `taps`
+    """
+    time = {"doppler": doppler, "num_time_steps": num_time_steps, "sampling_frequency": sampling_frequency}
+    a_b, tau_n = baseband_cir(a, tau, frequency, normalize_delays=True, **time)
+
+    frequencies = subcarrier_frequencies(solver_settings["num_subcarriers"], solver_settings["subcarrier_spacing"])
+    a_f, tau_f = baseband_cir(a, tau, frequency, normalize_delays=solver_settings["normalize_delays"], **time)
+    if cfr_out is None:
+        h_freq = cfr(a_f, tau_f, frequencies, normalize=solver_settings["normalize_energy"])
+    else:
+        h_freq = cfr_chunked(a_f, tau_f, frequencies, cfr_out, normalize=solver_settings["normalize_energy"],
+                             max_bytes=max_bytes)
+
+    h_taps = taps(a_f, tau_f, solver_settings["low_pass_bandwidth"], solver_settings["l_min"],
+                  solver_settings["l_max"], normalize=solver_settings["normalize_energy"])
+
+    return {"a": a_b, "tau": tau_n, "h_freq": h_freq, "taps": h_taps}
@@ -0,0 +1,239 @@
+"""
+Channel datasets streamed to disk in shards.
+
+Receiver positions are sampled uniformly in a region or from a radio map, and
+solved in batches of one shard each. Every shard is written to its own NPZ or
+TFRecord file as soon as it is solved and then recorded in a JSON manifest, so
+that memory use does not grow with the dataset size and an interrupted job
+resumes after the last completed shard. Every shard has its own seed derived
+from the dataset seed, so a shard is the same whether it is generated in one
+run or after a resume.
+
+Arrays of a shard, with the samples (receivers) on the first axis:
+    positions [num_samples, 3]
+    a         [num_samples, num_rx_ant, num_tx, num_tx_ant, num_paths]
+    tau       [num_samples, num_rx_ant, num_tx, num_tx_ant, num_paths] in s,
+              or [num_samples, num_tx, num_paths] with synthetic arrays
+    h_freq    [num_samples, num_rx_ant, num_tx, num_tx_ant, num_subcarriers]
+The number of paths differs from shard to shard; invalid paths have a zero
+coefficient and a delay of -1.
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+import mitsuba as mi
+import sionna.rt as rt
+
+from s4l_sionna_rt.solver.driver import channel_utils as ch
+from s4l_sionna_rt.solver.driver.radio_map_cache import RadioMapCache
+from s4l_sionna_rt.solver.driver.receiver_sets import add_receivers
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+DATASET_DIR = "dataset"
+EXTENSIONS = {"npz": ".npz", "tfrecord": ".tfrecord"}
+
+
+def shard_seed(seed: int, index: int) -> int:
+    """Seed of shard `index`, independent of the shards generated before it"""
+    return int(np.random.SeedSequence([seed, index]).generate_state(1)[0] & 0x7fffffff)
+
+
+def shard_filename(index: int, fmt: str) -> str:
+    return f"shard-{index:05d}{EXTENSIONS[fmt]}"
+
+
+def uniform_positions(center, size, num_positions: int, seed: int) -> np.ndarray:
+    """Positions [num_positions, 3] drawn uniformly in the box `center` +/- `size`/2"""
+    rng = np.random.default_rng(seed)
+    center = np.asarray(center, dtype=np.float64)
+    size = np.asarray(size, dtype=np.float64)
+    return center + (rng.random((num_positions, 3)) - 0.5)*size
+
+
+def radio_map_positions(rm, settings: dict, num_positions: int, seed: int) -> np.ndarray:
+    """Positions [num_positions, 3] sampled from a radio map, spread over the transmitters"""
+    num_tx = rm.path_gain.shape[0]
+    positions, _ = rm.sample_positions(num_pos=int(np.ceil(num_positions/num_tx)),
+                                       metric=settings["metric"],
+                                       min_val_db=settings["min_val_db"],
+                                       max_val_db=settings["max_val_db"],
+                                       tx_association=True,
+                                       seed=seed)
+    return positions.numpy().reshape(-1, 3)[:num_positions]
+
+
+def load_manifest(folder: str):
+    path = os.path.join(folder, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(folder: str, manifest: dict) -> None:
+    """Writes the manifest atomically, so that an interruption never leaves it half written"""
+    path = os.path.join(folder, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def write_npz_shard(filename: str, arrays: dict) -> None:
+    # np.savez appends .npz to names without it
+    np.savez(filename + ".tmp.npz", **arrays)
+    os.replace(filename + ".tmp.npz", filename)
+
+
+def write_tfrecord_shard(filename: str, arrays: dict) -> None:
+    """Writes one tf.train.Example per sample, with every array serialized as a tensor"""
+    try:
+        import tensorflow as tf
+    except ImportError as e:
+        raise ImportError("TFRecord shards require TensorFlow, use the npz format instead") from e
+
+    num_samples = len(arrays["positions"])
+    with tf.io.TFRecordWriter(filename + ".tmp") as writer:
+        for i in range(num_samples):
+            features = {k: tf.train.Feature(bytes_list=tf.train.BytesList(
+                            value=[tf.io.serialize_tensor(v[i]).numpy()]))
+                        for k, v in arrays.items()}
+            writer.write(tf.train.Example(features=tf.train.Features(feature=features)).SerializeToString())
+    os.replace(filename + ".tmp", filename)
+
+
+def solve_shard(scene, positions: np.ndarray, solver_settings: dict, frequencies: np.ndarray, seed: int) -> dict:
+    """
+    Solves the paths to one receiver per position and computes the channels.
+    The scene must not contain other receivers.
+    """
+    add_receivers(scene, positions, prefix="dataset")
+    try:
+        paths = rt.PathSolver()(scene=scene,
+                                max_depth=solver_settings["max_depth"],
+                                max_num_paths_per_src=solver_settings["max_number_paths_per_src"],
+                                samples_per_src=solver_settings["samples"],
+                                synthetic_array=solver_settings["synthetic_array"],
+                                los=solver_settings["los"],
+                                specular_reflection=solver_settings["specular_reflection"],
+                                diffuse_reflection=solver_settings["diffuse_reflection"],
+                                refraction=solver_settings["refraction"],
+                                seed=seed)
+        a, tau = paths.cir(normalize_delays=solver_settings["normalize_delays"], out_type="numpy")
+    finally:
+        for name in scene.receivers:
+            scene.remove(name)
+
+    h_freq = ch.cfr(a, tau, frequencies, normalize=solver_settings["normalize_energy"])
+    return {"positions": positions.astype(np.float32),
+            "a": a[..., 0],
+            "tau": tau.astype(np.float32),
+            "h_freq": h_freq[..., 0, :]}
+
+
+def setup_hash(scene_params: dict) -> str:
+    """Hash of the scene, carrier frequency, transmitters and antenna arrays of the input file"""
+    antennas = scene_params["Antennas"]
+    return RadioMapCache.digest({"scene": RadioMapCache.scene_hash(scene_params),
+                                 "transmitters": antennas["transmitters"],
+                                 "tx_array": antennas["tx_array"],
+                                 "rx_array": antennas["rx_array"]})
+
+
+def generate(scene, solver_settings: dict, scene_params: dict, output_dir: str) -> str:
+    """
+    Generates the channel dataset of the dataset settings of the Path solver,
+    skipping the shards already recorded in the manifest of the dataset folder.
+
+    Args:
+        scene: Sionna RT scene with the transmitters. Its receivers are
+            restored after the dataset is generated.
+        solver_settings: Path solver settings from the input file
+        scene_params: Scene parameters of the input file, hashed so that a
+            dataset is only resumed for the same scene, transmitters and arrays
+        output_dir: Results folder, used if no dataset folder is set
+
+    Returns:
+        The dataset folder
+    """
+    settings = solver_settings["dataset"]
+    folder = settings["folder"] or os.path.join(output_dir, DATASET_DIR)
+    os.makedirs(folder, exist_ok=True)
+
+    num_shards = int(np.ceil(settings["num_samples"]/settings["shard_size"]))
+    # Everything that changes the content of a shard
+    config = {k: settings[k] for k in ("num_samples", "shard_size", "sampling", "region_center", "region_size",
+                                       "cell_size", "metric", "min_val_db", "max_val_db", "format", "seed")}
+    config.update({k: solver_settings[k] for k in ("max_depth", "max_number_paths_per_src", "samples",
+                                                   "synthetic_array", "los", "specular_reflection",
+                                                   "diffuse_reflection", "refraction", "normalize_delays",
+                                                   "normalize_energy", "num_subcarriers", "subcarrier_spacing")})
+    config["setup_hash"] = setup_hash(scene_params)
+
+    manifest = load_manifest(folder)
+    if manifest is None:
+        manifest = {"config": config, "num_shards": num_shards, "frequency": float(scene.frequency[0]),
+                    "transmitters": list(scene.transmitters.keys()), "shards": []}
+    elif manifest["config"] != config:
+        raise ValueError(f"Dataset folder {folder} holds a dataset with other settings, choose another folder")
+    done = {s["index"] for s in manifest["shards"]
+            if os.path.exists(os.path.join(folder, s["file"]))}
+    if len(done) != 0:
+        logger.info(f"Dataset: resuming, {len(done)} of {num_shards} shards already completed")
+
+    frequencies = ch.subcarrier_frequencies(solver_settings["num_subcarriers"], solver_settings["subcarrier_spacing"])
+    write_shard = write_npz_shard if settings["format"] == "npz" else write_tfrecord_shard
+
+    # The receivers of the scene are set aside while the shards are solved
+    receivers = scene.receivers
+    for name in receivers:
+        scene.remove(name)
+    try:
+        rm = None
+        if settings["sampling"] == "radio_map" and len(done) < num_shards:
+            rm = rt.RadioMapSolver()(scene=scene,
+                                     center=mi.Point3f(settings["region_center"]),
+                                     orientation=mi.Point3f(0, 0, 0),
+                                     size=mi.Point2f(settings["region_size"][:2]),
+                                     cell_size=mi.Point2f(settings["cell_size"]),
+                                     samples_per_tx=solver_settings["samples"],
+                                     max_depth=solver_settings["max_depth"],
+                                     los=solver_settings["los"],
+                                     specular_reflection=solver_settings["specular_reflection"],
+                                     diffuse_reflection=solver_settings["diffuse_reflection"],
+                                     refraction=solver_settings["refraction"],
+                                     seed=settings["seed"])
+
+        for index in range(num_shards):
+            if index in done:
+                continue
+            seed = shard_seed(settings["seed"], index)
+            num_positions = min(settings["shard_size"], settings["num_samples"] - index*settings["shard_size"])
+            if rm is None:
+                positions = uniform_positions(settings["region_center"], settings["region_size"], num_positions, seed)
+            else:
+                positions = radio_map_positions(rm, settings, num_positions, seed)
+
+            arrays = solve_shard(scene, positions, solver_settings, frequencies, seed)
+            filename = shard_filename(index, settings["format"])
+            write_shard(os.path.join(folder, filename), arrays)
+
+            # A shard is only recorded once its file is complete
+            manifest["shards"] = [s for s in manifest["shards"] if s["index"] != index]
+            manifest["shards"].append({"index": index, "file": filename, "seed": seed,
+                                       "num_samples": len(positions),
+                                       "shapes": {k: list(v.shape) for k, v in arrays.items()}})
+            manifest["shards"].sort(key=lambda s: s["index"])
+            write_manifest(folder, manifest)
+            logger.info(f"Dataset: shard {index + 1}/{num_shards} written ({len(positions)} samples)")
+    finally:
+        for name in scene.receivers:
+            scene.remove(name)
+        for r in receivers.values():
+            scene.add(r)
+
+    return folder
@@ -11,14 +11,23 @@ import importlib.util
 import numpy as np
 import pyvista as pv
 from s4l_sionna_rt.solver.driver.api_models import SimulationOutput
+from s4l_sionna_rt.solver.driver import api_models as conf
 from s4l_sionna_rt.solver.driver.SionnaLoader import SionnaLoader
+from s4l_sionna_rt.solver.driver.pattern_lut import lut_shape
+from s4l_sionna_rt.solver.driver.radio_map_cache import RADIO_MAP_CACHE_DIR, RadioMapCache
+from s4l_sionna_rt.solver.driver.results_io import custom_json
+from s4l_sionna_rt.solver.driver import results_io as rio
 import sionna.rt as rt
 import mitsuba as mi
-
-def custom_json(obj):
-    if isinstance(obj,complex):
-        return {'__complex__':True, 'real':obj.real, 'imag':obj.imag}
-
+import drjit as dr
+from s4l_sionna_rt.solver.driver import path_reevaluation as pr
+from s4l_sionna_rt.solver.driver import beamforming as bf
+from s4l_sionna_rt.solver.driver import channel_utils as ch
+from s4l_sionna_rt.solver.driver import trajectory as traj
+from s4l_sionna_rt.solver.driver import dataset as ds
+from s4l_sionna_rt.solver.driver import radio_map_utils as rm_utils
+from s4l_sionna_rt.solver.driver import vtk_export as vtk
+from s4l_sionna_rt.solver.driver.receiver_sets import add_receivers, positions_from_settings
 
 
 # # --- CLI Argument Parsing ---
@@ -86,6 +95,13 @@ setup_settings = scene_params["Setup_settings"]
 antennas = scene_params["Antennas"]
 materials = scene_params["Materials"]
 render_settings = scene_params["Render_Settings"]
+# Settings groups added by newer versions are missing from older input files
+beam_sweep = conf.settings_group(solver_settings, "beam_sweep", conf.create_Beam_Sweep)["activate"] == True
+pruning_settings = conf.settings_group(solver_settings, "pruning", conf.create_Path_Pruning)
+time_evolution = conf.settings_group(solver_settings, "time_evolution", conf.create_Time_Evolution)
+trajectory_settings = conf.settings_group(solver_settings, "trajectory", conf.create_Trajectory)
+receiver_set_settings = conf.settings_group(solver_settings, "receiver_set", conf.create_Receiver_Set)
+dataset_settings = conf.settings_group(solver_settings, "dataset", conf.create_Dataset)
 
 ## Setup for custom antenna or scattering patterns, polarization models and polarizations
 
@@ -112,7 +128,9 @@ scene.temperature = setup_settings["temperature"]
 ##############################################
 
 if isinstance(antennas["tx_array"]["pattern"], dict):
-    t_pattern = customLoader.register_antenna_patterns(antennas["tx_array"]["pattern"]["custom"])[0]
+    # Optional lookup-table acceleration, with (0, 0) disabling it
+    t_lut = lut_shape(antennas["tx_array"].get("pattern_lut", (0, 0)), "Transmitter array pattern")
+    t_pattern = customLoader.register_antenna_patterns(antennas["tx_array"]["pattern"]["custom"], lut=t_lut)[0]
 else:
     t_pattern = antennas["tx_array"]["pattern"]
 
@@ -135,7 +153,8 @@ scene.tx_array = rt.PlanarArray(num_rows=antennas["tx_array"]["num_rows"],
                 )
 
 if isinstance(antennas["rx_array"]["pattern"], dict):
-    r_pattern = customLoader.register_antenna_patterns(antennas["rx_array"]["pattern"]["custom"])[0]
+    r_lut = lut_shape(antennas["rx_array"].get("pattern_lut", (0, 0)), "Receiver array pattern")
+    r_pattern = customLoader.register_antenna_patterns(antennas["rx_array"]["pattern"]["custom"], lut=r_lut)[0]
 else:
     r_pattern = antennas["rx_array"]["pattern"]
 
@@ -223,7 +242,9 @@ if len(materials)!=0:
                 )
         else:
             if isinstance(materials[mat]["scattering_pattern"],dict):
-                scat_p = customLoader.register_scattering_patterns(materials[mat]["scattering_pattern"]["custom"])[0]
+                scat_lut = lut_shape(materials[mat].get("scattering_lut", (0, 0, 0)), f"Scattering pattern of {mat}")
+                scat_p = customLoader.register_scattering_patterns(materials[mat]["scattering_pattern"]["custom"],
+                                                                   lut=scat_lut)[0]
             else:
                 scat_p = materials[mat]["scattering_pattern"]
             mats.append(rt.RadioMaterial(name=mat, thickness = materials[mat]["thickness"], 
@@ -261,23 +282,110 @@ if solver_settings["type"] == "RadioMap":
         center = mi.Point3f(solver_settings["resizing"]["center"])
         orientation = mi.Point3f(solver_settings["resizing"]["orientation"])
 
-    rm = solver(scene=scene, 
-                center = center,
-                orientation = orientation,
-                size=size,
-                cell_size=mi.Point2f(solver_settings["cell_size"]),
-                samples_per_tx=solver_settings["samples"],
-                max_depth=solver_settings["max_depth"],
-                los=solver_settings["los"],
-                specular_reflection=solver_settings["specular_reflection"],
-                diffuse_reflection = solver_settings["diffuse_reflection"],
-                refraction = solver_settings["refraction"],
-                seed = solver_settings["seed"],
-                rr_depth=solver_settings["rr_depth"],
-                rr_prob = solver_settings["rr_prob"],
-                stop_threshold=solver_settings["stop_threshold"]
-                )
+    solver_kwargs = dict(
+        cell_size=mi.Point2f(solver_settings["cell_size"]),
+        samples_per_tx=solver_settings["samples"],
+        max_depth=solver_settings["max_depth"],
+        los=solver_settings["los"],
+        specular_reflection=solver_settings["specular_reflection"],
+        diffuse_reflection = solver_settings["diffuse_reflection"],
+        refraction = solver_settings["refraction"],
+        seed = solver_settings["seed"],
+        rr_depth=solver_settings["rr_depth"],
+        rr_prob = solver_settings["rr_prob"],
+        stop_threshold=solver_settings["stop_threshold"]
+    )
+
+    rm_cached = solver_settings.get("cache", False) == True
+    if rm_cached and solver_settings["sample_positions"]["activate"] == True:
+        logger.warning("Sampling positions needs a traced radio map, the per-transmitter cache is not used")
+        rm_cached = False
+
+    if rm_cached:
+        # Per-transmitter cache: only new or changed transmitters are traced
+        if center is None:
+            # Same default grid as the RadioMapSolver, made explicit so that cached
+            # and newly traced maps share the same cells
+            scene_min = scene.mi_scene.bbox().min
+            scene_min = dr.select(dr.isinf(scene_min), -1.0, scene_min)
+            scene_max = scene.mi_scene.bbox().max
+            scene_max = dr.select(dr.isinf(scene_max), 1.0, scene_max)
+            center = 0.5 * (scene_min + scene_max)
+            center.z = 1.5
+            size = scene_max - scene_min
+            size = mi.Point2f(size.x, size.y)
+            orientation = dr.zeros(mi.Point3f, 1)
+
+        cache_dir = solver_settings.get("cache_folder", "") or os.path.join(output_dir, RADIO_MAP_CACHE_DIR)
+        cache_max_size = solver_settings.get("cache_max_size", conf.create_RadioMap().cache_max_size.value)
+        rm_cache = RadioMapCache(cache_dir, max_bytes=int(cache_max_size*2**20))
+        scene_hash = RadioMapCache.scene_hash(scene_params)
+        cache_keys = [RadioMapCache.key(scene_hash, antennas["transmitters"][tr], antennas["tx_array"], solver_settings)
+                      for tr in antennas["transmitters"].keys()]
+        path_gains = [rm_cache.load(k) for k in cache_keys]
+        missing = [i for i, pg in enumerate(path_gains) if pg is None]
+        logger.info(f"Radio map cache: {len(trx) - len(missing)} transmitters cached, {len(missing)} to trace")
+
+        if len(missing) != 0:
+            for t in trx:
+                scene.remove(t.name)
+            for i in missing:
+                scene.add(trx[i])
+            new_path_gain = solver(scene=scene, center=center, orientation=orientation, size=size,
+                                   **solver_kwargs).path_gain.numpy()
+            for j, i in enumerate(missing):
+                path_gains[i] = new_path_gain[j]
+                rm_cache.store(cache_keys[i], new_path_gain[j])
+            # Restore all transmitters in their original order
+            for i in missing:
+                scene.remove(trx[i].name)
+            for t in trx:
+                scene.add(t)
+
+        # RadioMap has no public setter for the path gain, the maps are served from the cached
+        # arrays as NumPy arrays and the RadioMap only provides the geometry of the cells
+        rm = rt.RadioMap(scene, center, orientation, size, solver_kwargs["cell_size"])
+        path_gain = np.stack(path_gains)
+        rss, sinr = rm_utils.recompute_rss_sinr(
+            path_gain, [antennas["transmitters"][tr]["power_dbm"] for tr in antennas["transmitters"].keys()],
+            setup_settings["bandwidth"], setup_settings["temperature"])
+        logger.info("Radio map served from the cache, the render shows no radio map")
+    else:
+        rm = solver(scene=scene, 
+                    center = center,
+                    orientation = orientation,
+                    size=size,
+                    **solver_kwargs
+                    )
 
+    if beam_sweep:
+        # All beams in one trace: every transmitter is replicated once per beam,
+        # each copy with its own precoding vector
+        codebook = bf.codebook_from_settings(solver_settings["beam_sweep"], antennas["tx_array"],
+                                             len(scene.tx_array.antenna_pattern.patterns))
+        num_beams = codebook.shape[0]
+        for t in trx:
+            scene.remove(t.name)
+        beam_trx = []
+        for t in trx:
+            for b in range(num_beams):
+                beam_trx.append(rt.Transmitter(f"{t.name}-beam-{b}", position=t.position,
+                                               orientation=t.orientation, power_dbm=t.power_dbm))
+                scene.add(beam_trx[-1])
+        # The solver applies h^T p, the codebook is defined for h^H p
+        precoding = np.conj(np.tile(codebook, (len(trx), 1)))
+        beam_rm = solver(scene=scene, center=rm.center, orientation=rm.orientation, size=rm.size,
+                         precoding_vec=(mi.TensorXf(precoding.real), mi.TensorXf(precoding.imag)),
+                         **solver_kwargs)
+        # Shape: [num_tx, num_beams, num_cells_y, num_cells_x]
+        beam_gain = beam_rm.path_gain.numpy()
+        beam_gain = beam_gain.reshape(len(trx), num_beams, *beam_gain.shape[1:])
+        best_beam, best_beam_gain = bf.best_beam(beam_gain, axis=1)
+        for t in beam_trx:
+            scene.remove(t.name)
+        for t in trx:
+            scene.add(t)
+        logger.info(f"Beam sweep: {num_beams} beams evaluated for {len(trx)} transmitters")
 
     if solver_settings["sample_positions"]["activate"] == True:
         positions,cell_ids = rm.sample_positions(num_pos=solver_settings["sample_positions"]["num_positions"], 
@@ -291,14 +399,48 @@ if solver_settings["type"] == "RadioMap":
                                           seed = solver_settings["sample_positions"]["seed"]
         )
 
-        positions = np.squeeze(positions.numpy())
-
-        summary.update({"positions": positions.tolist(), "cell_ids":cell_ids.numpy().tolist()})
-        for l,tx in enumerate(positions):
-            for ll, p in enumerate(tx):
-                r = rt.Receiver(f"rx-{len(positions[1])*l + ll}", position = p.tolist(), orientation = [0,0,0])
-                scene.add(r)
-                rx.append(r)
+        # Shape: [num_tx, num_positions, 3]
+        positions = positions.numpy()
+        cell_ids = cell_ids.numpy()
+
+        # Receiver "rx-{i*num_positions + j}" is sample j of transmitter i
+        sampled_rx_offset = len(scene.receivers)
+        sampled_rx = add_receivers(scene, positions.reshape(-1, 3), prefix="rx")
+        rx.extend(sampled_rx)
+
+    sampled_paths = None
+    if solver_settings["sample_positions"]["activate"] == True and conf.settings_group(solver_settings, "sample_positions", conf.create_Sample_Positions)["trace_paths"] == True:
+        # Second stage in the same process: the scene is already loaded and the
+        # sampled receivers are in it, so the paths are traced right away. The
+        # other receivers are removed meanwhile, so that receiver j of the sampled
+        # CIR/CFR files is sample j, as for the positions of the summary
+        other_rx = list(scene.receivers.values())[:sampled_rx_offset]
+        for r in other_rx:
+            scene.remove(r.name)
+        sample_settings = solver_settings["sample_positions"]
+        sampled_paths = rt.PathSolver()(scene=scene,
+                                        max_depth=solver_settings["max_depth"],
+                                        max_num_paths_per_src=sample_settings["max_number_paths_per_src"],
+                                        samples_per_src=solver_settings["samples"],
+                                        synthetic_array=True,
+                                        los=solver_settings["los"],
+                                        specular_reflection=solver_settings["specular_reflection"],
+                                        diffuse_reflection=solver_settings["diffuse_reflection"],
+                                        refraction=solver_settings["refraction"],
+                                        seed=solver_settings["seed"])
+        # Restore all receivers in their original order
+        for r in sampled_rx:
+            scene.remove(r.name)
+        for r in other_rx + sampled_rx:
+            scene.add(r)
+
+        a_s, tau_s = sampled_paths.cir(normalize_delays=True, out_type="numpy")
+        sampled_cir = rio.to_sparse_cir(a_s, tau_s/1e-9)
+        rio.save_sparse_cir(os.path.join(output_dir, rio.SAMPLED_CIR_OUTPUT), sampled_cir)
+        frequencies = ch.subcarrier_frequencies(sample_settings["num_subcarriers"], sample_settings["subcarrier_spacing"])
+        sampled_h_freq = ch.cfr(a_s, tau_s, frequencies)
+        np.save(os.path.join(output_dir, rio.SAMPLED_CFR_OUTPUT), sampled_h_freq)
+        logger.info(f"Sampled positions: {len(sampled_cir['tau'])} valid paths traced to {len(sampled_rx)} sampled receivers")
     
     if solver_settings["rescaling"]["activate"] == True:
         rm_vmin = solver_settings["rescaling"]["rm_vmin"]
@@ -307,7 +449,8 @@ if solver_settings["type"] == "RadioMap":
         rm_vmin = None
         rm_vmax = None
 
-    scene.render_to_file(camera=my_cam, filename = output_dir + "/render_file.png", radio_map = rm, 
+    scene.render_to_file(camera=my_cam, filename = output_dir + "/render_file.png",
+                        radio_map = None if rm_cached else rm, paths = sampled_paths,
                         fov = render_settings["fov"],
                         lighting_scale=render_settings["lighting_scale"],
                         clip_plane_orientation=render_settings["clip_plane_orientation"],
@@ -320,26 +463,97 @@ if solver_settings["type"] == "RadioMap":
                         rm_metric=solver_settings["rm_metric"],
                         )
         
+    if not rm_cached:
+        path_gain = rm.path_gain.numpy()
+        rss = rm.rss.numpy()
+        sinr = rm.sinr.numpy()
     summary = {
         "type":"RadioMap",
-        "path_gain":rm.path_gain.numpy().tolist(),
-        "rss": rm.rss.numpy().tolist(),
-        "sinr": rm.sinr.numpy().tolist(),
+        "path_gain":path_gain.tolist(),
+        "rss": rss.tolist(),
+        "sinr": sinr.tolist(),
         "image":output_dir + "/render_file.png",
         "vmin":rm_vmin,
         "vmax":rm_vmax,
         "db_scale":solver_settings["rm_db_scale"],
+        # Inputs needed to recompute rss/sinr from path_gain without retracing
+        "tx_names": list(antennas["transmitters"].keys()),
+        "power_dbm": [antennas["transmitters"][tr]["power_dbm"] for tr in antennas["transmitters"].keys()],
+        "bandwidth": setup_settings["bandwidth"],
+        "temperature": setup_settings["temperature"],
+        # Geometry of the measurement plane, to query the maps at arbitrary positions
+        "center": np.array(rm.center).reshape(-1).tolist(),
+        "orientation": np.array(rm.orientation).reshape(-1).tolist(),
+        "size": np.array(rm.size).reshape(-1).tolist(),
+        "cell_size": np.array(rm.cell_size).reshape(-1).tolist(),
     }
+    if beam_sweep:
+        summary.update({"beam_gain": beam_gain.tolist(),
+                        "best_beam": best_beam.tolist(),
+                        "best_beam_gain": best_beam_gain.tolist()})
+    # Best-server, coverage and capacity maps, so that the UI does not rebuild them from the per-tx maps
+    summary["kpi"] = rm_utils.kpi_summary(rm_utils.kpi_maps(
+        rss, setup_settings["bandwidth"], setup_settings["temperature"],
+        rm_utils.parse_thresholds(solver_settings.get("coverage_thresholds", "0"))))
+    if solver_settings["sample_positions"]["activate"] == True:
+        summary.update({"positions": np.squeeze(positions).tolist(), "cell_ids": cell_ids.tolist(),
+                        "rx_offset": sampled_rx_offset})
+    if len(scene.receivers) != 0:
+        # Radio map values at the receivers, interpolated from the cells
+        rx_positions = np.array([np.array(r.position).reshape(-1) for r in scene.receivers.values()])
+        summary["receiver_values"] = {"names": list(scene.receivers.keys()), "positions": rx_positions.tolist(),
+                                      **{k: v.tolist() for k, v in rm_utils.query(summary, rx_positions).items()}}
+    if sampled_paths is not None:
+        # Same keys as the Path solver outputs, for the sampled receivers
+        summary.update({"cir_file": rio.SAMPLED_CIR_OUTPUT, "h_freq_file": rio.SAMPLED_CFR_OUTPUT})
+    # Grids in world coordinates for the field viewer
+    summary["vtk_files"] = vtk.write_radio_map(output_dir,
+                                               {"path_gain": path_gain, "rss": rss, "sinr": sinr},
+                                               summary, list(scene.transmitters.keys()))
 
     with open(os.path.join(output_dir, "summary.json"), "w") as f:
         json.dump(summary, f, indent=2,  default=custom_json)
+    # Shapes and names only, so that the extractor does not parse the summary to build its UI
+    shapes = {"path_gain": rss.shape, "rss": rss.shape, "sinr": rss.shape}
+    if beam_sweep:
+        shapes.update({"beam_gain": beam_gain.shape, "best_beam": best_beam.shape,
+                       "best_beam_gain": best_beam_gain.shape})
+    if sampled_paths is not None:
+        shapes["h_freq"] = sampled_h_freq.shape
+    rio.write_manifest(output_dir, rio.build_manifest(summary, shapes, list(scene.transmitters.keys()),
+                                                      list(scene.receivers.keys())))
 else:
+    if dataset_settings["activate"] == True:
+        # Streamed to shards before the configured receivers are solved as usual
+        dataset_dir = ds.generate(scene, solver_settings, scene_params, output_dir)
+
+    if trajectory_settings["activate"] == True:
+        # The whole route is solved in the same PathSolver call, one receiver per sample
+        trajectory = traj.trajectory_from_settings(trajectory_settings)
+        trajectory_rx_offset = len(scene.receivers)
+        add_receivers(scene, trajectory["positions"], prefix="trajectory",
+                      velocities=trajectory["velocities"])
+
+    if receiver_set_settings["activate"] == True:
+        # Measurement grid or imported point set
+        receiver_set_positions = positions_from_settings(receiver_set_settings)
+        receiver_set_rx_offset = len(scene.receivers)
+        add_receivers(scene, receiver_set_positions, prefix=receiver_set_settings["source"])
+
+    frozen_paths = solver_settings.get("frozen_paths", False) == True
+    if frozen_paths:
+        # Trace with dual-polarized probe arrays; the configured arrays are applied
+        # to the stored paths afterwards and can be changed later without retracing
+        tx_array, rx_array = scene.tx_array, scene.rx_array
+        scene.tx_array = pr.probe_array()
+        scene.rx_array = pr.probe_array()
+
     solver = rt.PathSolver()
     paths = solver(scene=scene, 
                 max_depth = solver_settings["max_depth"], 
                 max_num_paths_per_src=solver_settings["max_number_paths_per_src"],
                 samples_per_src=solver_settings["samples"],
-                synthetic_array=solver_settings["synthetic_array"],
+                synthetic_array=True if frozen_paths else solver_settings["synthetic_array"],
                 los=solver_settings["los"],
                 specular_reflection=solver_settings["specular_reflection"],
                 diffuse_reflection=solver_settings["diffuse_reflection"],
@@ -349,60 +563,185 @@ else:
     
     print(paths)
 
-    scene.render_to_file(camera=my_cam, 
-                        filename = output_dir + "/render_file.png" ,
-                        fov = render_settings["fov"],
-                        lighting_scale=render_settings["lighting_scale"],
-                        clip_plane_orientation=render_settings["clip_plane_orientation"],
-                        envmap=render_settings["envmap"],
-                        num_samples = render_settings["num_samples"],
-                        resolution=(int(render_settings["resolution"][0]),int(render_settings["resolution"][1])),
-                        paths=paths
-                        )
-
-
-    a, tau = paths.cir(normalize_delays=True, out_type="numpy")
-    # Shape: [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths, num_time_steps]
-    print("Shape of a: ", a.shape)
-
-    # Shape: [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths]
-    tau = tau/1e-9  #Scaled to ns
-    print("Shape of tau: ", tau.shape)
-
-    # Compute frequencies of subcarriers relative to the carrier frequency
-    frequencies = rt.subcarrier_frequencies(solver_settings["num_subcarriers"], solver_settings["subcarrier_spacing"])
-
-    # Compute channel frequency response
-    h_freq = paths.cfr(frequencies=frequencies,
-                    normalize=solver_settings["normalize_energy"],  # Normalize energy
-                    normalize_delays=solver_settings["normalize_delays"],
-                    out_type="numpy")
-
-    # Shape: [num_rx, num_rx_ant, num_tx, num_tx_ant, num_time_steps, num_subcarriers]
-    print("Shape of h_freq: ", h_freq.shape)
-
-    if isinstance(solver_settings["sampling_frequency"],dict):
-        sampling_frequency = solver_settings["sampling_frequency"]["Custom"]
+    vtk_files = {}
+    if solver_settings.get("export_paths", False) == True:
+        # Polylines for the 3D viewer, independent of the camera
+        vtk_files["paths"] = vtk.write_paths(output_dir, paths)
+
+    render_image = solver_settings.get("render_image", True) == True
+    if render_image:
+        scene.render_to_file(camera=my_cam, 
+                            filename = output_dir + "/render_file.png" ,
+                            fov = render_settings["fov"],
+                            lighting_scale=render_settings["lighting_scale"],
+                            clip_plane_orientation=render_settings["clip_plane_orientation"],
+                            envmap=render_settings["envmap"],
+                            num_samples = render_settings["num_samples"],
+                            resolution=(int(render_settings["resolution"][0]),int(render_settings["resolution"][1])),
+                            paths=paths
+                            )
+
+    pruning = pruning_settings["activate"] == True
+    # The CFR is streamed to disk in subcarrier blocks if a memory budget is set
+    cfr_budget = solver_settings.get("cfr_memory_budget", conf.create_Path().cfr_memory_budget.value)*2**20
+    chunked_cfr = cfr_budget > 0
+    cfr_path = os.path.join(output_dir, rio.CFR_OUTPUT)
+
+    # Time series from the Doppler shifts of the single trace
+    if time_evolution["activate"] == True:
+        num_time_steps = time_evolution["num_time_steps"]
+        time_sampling_frequency = time_evolution["sampling_frequency"]
     else:
-        sampling_frequency = None
-
-    taps = paths.taps(bandwidth=solver_settings["low_pass_bandwidth"], # Bandwidth to which the channel is low-pass filtered 
-                  l_min=solver_settings["l_min"],        # Smallest time lag
-                  l_max=solver_settings["l_max"],       # Largest time lag
-                  sampling_frequency=sampling_frequency, # Sampling at Nyquist rate, i.e., 1/bandwidth
-                  normalize=solver_settings["normalize_energy"],  # Normalize energy
-                  normalize_delays=solver_settings["normalize_delays"],
-                  out_type="numpy")
-    print("Shape of taps: ", taps.shape)
+        num_time_steps = 1
+        time_sampling_frequency = None
+    time_kwargs = dict(num_time_steps=num_time_steps)
+    if time_sampling_frequency is not None:
+        time_kwargs["sampling_frequency"] = time_sampling_frequency
+
+    if frozen_paths:
+        frozen = pr.freeze_paths(paths, scene)
+        pr.save_frozen_paths(os.path.join(output_dir, pr.FROZEN_PATHS_FILE), frozen, solver_settings, antennas)
+        scene.tx_array, scene.rx_array = tx_array, rx_array
+        a_pass, tau_pass = pr.reevaluate(frozen, tx_array, rx_array), frozen["tau"]
+        doppler_pass = frozen["doppler"]
+    elif pruning:
+        a_pass = paths.a[0].numpy() + 1j*paths.a[1].numpy()
+        tau_pass = paths.tau.numpy()
+        doppler_pass = paths.doppler.numpy()
+
+    if frozen_paths or pruning:
+        if pruning:
+            # Weak paths are dropped before computing the channels
+            a_pass, tau_pass, (doppler_pass,), pruning_stats = ch.prune_paths(
+                a_pass, tau_pass, extra=(doppler_pass,),
+                threshold_db=pruning_settings["threshold_db"] if pruning_settings["threshold_db"] > 0 else None,
+                top_k=pruning_settings["top_k"] if pruning_settings["top_k"] > 0 else None)
+            logger.info(f"Path pruning: {pruning_stats['num_valid_paths_after']} of {pruning_stats['num_valid_paths_before']} paths kept, "
+                        f"{100*pruning_stats['total_pruned_energy_fraction']:.3g}% of the energy pruned")
+
+        cfr_out = None
+        if chunked_cfr:
+            cfr_out = rio.open_array_output(cfr_path, a_pass.shape[:4] + (num_time_steps, solver_settings["num_subcarriers"]))
+        channels = ch.compute_channels(a_pass, tau_pass, scene.frequency[0], solver_settings,
+                                       cfr_out=cfr_out, max_bytes=cfr_budget, doppler=doppler_pass,
+                                       **time_kwargs)
+        a = channels["a"]
+        tau = channels["tau"]/1e-9  #Scaled to ns
+        h_freq = channels["h_freq"]
+        taps = channels["taps"]
+    else:
+        a, tau = paths.cir(normalize_delays=True, out_type="numpy", **time_kwargs)
+        # Shape: [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths, num_time_steps]
+        print("Shape of a: ", a.shape)
+
+        # Shape: [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths]
+        tau = tau/1e-9  #Scaled to ns
+        print("Shape of tau: ", tau.shape)
+
+        # Compute frequencies of subcarriers relative to the carrier frequency
+        frequencies = rt.subcarrier_frequencies(solver_settings["num_subcarriers"], solver_settings["subcarrier_spacing"])
+
+        # Compute channel frequency response
+        if chunked_cfr:
+            a_f, tau_f = paths.cir(normalize_delays=solver_settings["normalize_delays"], out_type="numpy", **time_kwargs)
+            frequencies = ch.subcarrier_frequencies(solver_settings["num_subcarriers"], solver_settings["subcarrier_spacing"])
+            h_freq = rio.open_array_output(cfr_path, a_f.shape[:4] + (a_f.shape[5], len(frequencies)))
+            ch.cfr_chunked(a_f, tau_f, frequencies, h_freq, normalize=solver_settings["normalize_energy"],
+                           max_bytes=cfr_budget)
+        else:
+            h_freq = paths.cfr(frequencies=frequencies,
+                            normalize=solver_settings["normalize_energy"],  # Normalize energy
+                            normalize_delays=solver_settings["normalize_delays"],
+                            out_type="numpy",
+                            **time_kwargs)
+
+        # Shape: [num_rx, num_rx_ant, num_tx, num_tx_ant, num_time_steps, num_subcarriers]
+        print("Shape of h_freq: ", h_freq.shape)
+
+        if time_sampling_frequency is not None:
+            sampling_frequency = time_sampling_frequency
+        elif isinstance(solver_settings["sampling_frequency"],dict):
+            sampling_frequency = solver_settings["sampling_frequency"]["Custom"]
+        else:
+            sampling_frequency = None
+
+        taps = paths.taps(bandwidth=solver_settings["low_pass_bandwidth"], # Bandwidth to which the channel is low-pass filtered 
+                      l_min=solver_settings["l_min"],        # Smallest time lag
+                      l_max=solver_settings["l_max"],       # Largest time lag
+                      sampling_frequency=sampling_frequency, # Sampling at Nyquist rate, i.e., 1/bandwidth
+                      normalize=solver_settings["normalize_energy"],  # Normalize energy
+                      normalize_delays=solver_settings["normalize_delays"],
+                      num_time_steps=num_time_steps,
+                      out_type="numpy")
+        print("Shape of taps: ", taps.shape)
+
+    if beam_sweep:
+        # All beams applied at once to the unnormalized CFR of the stored coefficients
+        codebook = bf.codebook_from_settings(solver_settings["beam_sweep"], antennas["tx_array"],
+                                             len(scene.tx_array.antenna_pattern.patterns))
+        frequencies = ch.subcarrier_frequencies(solver_settings["num_subcarriers"], solver_settings["subcarrier_spacing"])
+        # Shape: [num_rx, num_tx, num_beams]
+        # Computed in blocks of subcarriers, within the CFR memory budget if one is set
+        beam_kwargs = {"max_bytes": cfr_budget} if chunked_cfr else {}
+        beam_gain = bf.beam_gains_chunked(a, tau*1e-9, frequencies, codebook, **beam_kwargs)
+        best_beam, best_beam_gain = bf.best_beam(beam_gain)
+
+    # Delay spread, K-factor and power of every rx/tx pair, shape [num_rx, num_tx]
+    link_stats = ch.link_statistics(a, tau)
 
     summary = {
         "type":"Path",
-        "a":a.tolist(),
-        "tau": tau.tolist(),
-        "h_freq": h_freq.tolist(),
         "taps": taps.tolist(),
-        "image":output_dir + "/render_file.png",
+        "image":output_dir + "/render_file.png" if render_image else None,
     }
+    if chunked_cfr:
+        h_freq.flush()
+        summary["h_freq_file"] = rio.CFR_OUTPUT
+    else:
+        summary["h_freq"] = h_freq.tolist()
+    if solver_settings.get("sparse_cir", False) == True:
+        # Only valid paths are stored, packed per link next to the summary
+        sparse_cir = rio.to_sparse_cir(a, tau)
+        rio.save_sparse_cir(os.path.join(output_dir, rio.SPARSE_CIR_OUTPUT), sparse_cir)
+        logger.info(f"Sparse CIR: {len(sparse_cir['tau'])} valid of {a[..., 0].size} path entries stored")
+        summary["cir_file"] = rio.SPARSE_CIR_OUTPUT
+    else:
+        summary.update({"a":a.tolist(), "tau": tau.tolist()})
+    if beam_sweep:
+        summary.update({"beam_gain": beam_gain.tolist(),
+                        "best_beam": best_beam.tolist(),
+                        "best_beam_gain": best_beam_gain.tolist()})
+    # Delays in ns, non-finite values (links without paths, single-path K-factors) as None
+    summary["link_stats"] = {k: np.where(np.isfinite(v), v, None).tolist() for k, v in link_stats.items()}
+    if num_time_steps > 1:
+        summary["time_steps"] = (np.arange(num_time_steps)/time_sampling_frequency).tolist()
+    if trajectory_settings["activate"] == True:
+        # Sample i of the route is receiver rx_offset + i of the outputs
+        summary["trajectory"] = {
+            "rx_offset": trajectory_rx_offset,
+            "positions": trajectory["positions"].tolist(),
+            "distance": trajectory["distance"].tolist(),
+            "times": None if trajectory["times"] is None else trajectory["times"].tolist(),
+        }
+    if receiver_set_settings["activate"] == True:
+        summary["receiver_set"] = {
+            "rx_offset": receiver_set_rx_offset,
+            "positions": receiver_set_positions.tolist(),
+        }
+    if dataset_settings["activate"] == True:
+        summary["dataset"] = os.path.join(dataset_dir, ds.MANIFEST)
+    if len(vtk_files) != 0:
+        summary["vtk_files"] = vtk_files
+    if pruning:
+        summary["pruning"] = {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in pruning_stats.items()}
 
     with open(os.path.join(output_dir, "summary.json"), "w") as f:
-        json.dump(summary, f, indent=2, default=custom_json)
\ No newline at end of file
+        json.dump(summary, f, indent=2, default=custom_json)
+    # Shapes and names only, so that the extractor does not parse the summary to build its UI
+    shapes = {"h_freq": h_freq.shape, "a": a.shape, "tau": tau.shape, "taps": taps.shape,
+              "link_stats": link_stats["total_power"].shape}
+    if beam_sweep:
+        shapes.update({"beam_gain": beam_gain.shape, "best_beam": best_beam.shape,
+                       "best_beam_gain": best_beam_gain.shape})
+    rio.write_manifest(output_dir, rio.build_manifest(summary, shapes, list(scene.transmitters.keys()),
+                                                      list(scene.receivers.keys())))
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""
+Re-evaluation of traced paths for other antenna arrays and orientations.
+
+The channel coefficient of a path is a bilinear form a = u^H T v between the
+receive pattern u, the transfer matrix T of the path and the transmit pattern
+v, all expressed in the implicit world basis. Tracing once with single-element
+dual-polarized probe arrays measures T for every path (the "frozen" paths),
+from which the coefficients of any other pattern, polarization, array layout
+or device orientation follow without ray tracing. Array layouts are applied
+as synthetic arrays, i.e., through plane-wave phase shifts.
+"""
+
+import argparse
+import json
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+import mitsuba as mi
+import sionna.rt as rt
+from sionna.rt.antenna_pattern import antenna_pattern_to_world_implicit
+from sionna.rt.utils import rotation_matrix
+from s4l_sionna_rt.solver.driver import channel_utils as ch
+from s4l_sionna_rt.solver.driver.results_io import write_summary
+from s4l_sionna_rt.solver.driver.SionnaLoader import SionnaLoader
+
+logger = logging.getLogger(__name__)
+
+FROZEN_PATHS_FILE = "frozen_paths.npz"
+
+# Single dual-polarized isotropic element used to measure the transfer matrices
+PROBE_ARRAY = {"num_rows": 1, "num_cols": 1, "pattern": "iso", "polarization": "VH",
+               "polarization_model": "tr38901_2"}
+
+
+def probe_array() -> rt.PlanarArray:
+    return rt.PlanarArray(**PROBE_ARRAY)
+
+
+def _orientations(devices) -> np.ndarray:
+    return np.array([[d.orientation.x[0], d.orientation.y[0], d.orientation.z[0]] for d in devices],
+                    dtype=np.float32).reshape(-1, 3)
+
+
+def _positions(devices) -> np.ndarray:
+    return np.array([[d.position.x[0], d.position.y[0], d.position.z[0]] for d in devices],
+                    dtype=np.float32).reshape(-1, 3)
+
+
+def freeze_paths(paths, scene) -> dict:
+    """
+    Extracts the pattern-independent data of paths traced with probe arrays
+    and a synthetic array.
+
+    Returns:
+        Dictionary of NumPy arrays. ``a_probe`` has the shape
+        [num_rx, 2, num_tx, 2, num_paths], the angles, delays and Doppler
+        shifts have the shape [num_rx, num_tx, num_paths].
+    """
+    if not paths.synthetic_array:
+        raise ValueError("Frozen paths require paths traced with a synthetic array")
+    a_real, a_imag = paths.a
+    return {
+        "a_probe": (a_real.numpy() + 1j*a_imag.numpy()).astype(np.complex64),
+        "tau": paths.tau.numpy(),
+        "theta_t": paths.theta_t.numpy(),
+        "phi_t": paths.phi_t.numpy(),
+        "theta_r": paths.theta_r.numpy(),
+        "phi_r": paths.phi_r.numpy(),
+        "doppler": paths.doppler.numpy(),
+        "tx_orientations": _orientations(scene.transmitters.values()),
+        "rx_orientations": _orientations(scene.receivers.values()),
+        "tx_positions": _positions(scene.transmitters.values()),
+        "rx_positions": _positions(scene.receivers.values()),
+        "frequency": np.float64(scene.frequency[0]),
+        "wavelength": np.float64(scene.wavelength[0]),
+    }
+
+
+def save_frozen_paths(filename: str, frozen: dict, solver_settings: dict, antennas: dict) -> None:
+    """Stores frozen paths with the settings needed to rebuild the channels"""
+    np.savez_compressed(filename,
+                        solver_settings=json.dumps(solver_settings),
+                        tx_array=json.dumps(antennas["tx_array"]),
+                        rx_array=json.dumps(antennas["rx_array"]),
+                        **frozen)
+
+
+def load_frozen_paths(filename: str) -> dict:
+    with np.load(filename) as data:
+        frozen = {k: data[k] for k in data.files}
+    for k in ["solver_settings", "tx_array", "rx_array"]:
+        frozen[k] = json.loads(str(frozen[k]))
+    return frozen
+
+
+def _unit_vectors(theta: np.ndarray, phi: np.ndarray) -> np.ndarray:
+    return np.stack([np.sin(theta)*np.cos(phi), np.sin(theta)*np.sin(phi), np.cos(theta)], axis=-1)
+
+
+def _world_patterns(patterns, orientations: np.ndarray, k_world: np.ndarray, direction: str) -> np.ndarray:
+    """
+    Evaluates antenna patterns in the implicit world basis.
+
+    Args:
+        patterns: List of antenna pattern callables
+        orientations: Device orientation of every entry [N, 3]
+        k_world: Direction of every entry [N, 3]
+        direction: "out" for transmitters, "in" for receivers
+
+    Returns:
+        Complex Jones vectors of shape [num_patterns, N, 2]
+    """
+    to_world = rotation_matrix(mi.Point3f(orientations[:, 0], orientations[:, 1], orientations[:, 2]))
+    k = mi.Vector3f(k_world[:, 0], k_world[:, 1], k_world[:, 2])
+    out = []
+    for pattern in patterns:
+        f = antenna_pattern_to_world_implicit(pattern, to_world, k, direction)
+        f = [np.array(c) for c in (f.x, f.y, f.z, f.w)]
+        out.append(np.stack([f[0] + 1j*f[2], f[1] + 1j*f[3]], axis=-1))
+    return np.stack(out)
+
+
+def _array_offsets(array, wavelength: float, orientations: np.ndarray) -> np.ndarray:
+    """Rotated antenna positions relative to each device [num_devices, array_size, 3]"""
+    offsets = []
+    for o in orientations:
+        p = array.rotate(wavelength, mi.Point3f(*[float(v) for v in o]))
+        offsets.append(np.stack([np.array(p.x), np.array(p.y), np.array(p.z)], axis=-1))
+    return np.stack(offsets)
+
+
+def reevaluate(frozen: dict, tx_array, rx_array, tx_orientations: Optional[np.ndarray] = None,
+               rx_orientations: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Computes the passband path coefficients for new arrays and orientations.
+
+    Args:
+        frozen: Frozen paths, as returned by freeze_paths() or load_frozen_paths()
+        tx_array: Transmitter antenna array (sionna.rt.AntennaArray)
+        rx_array: Receiver antenna array (sionna.rt.AntennaArray)
+        tx_orientations: New transmitter orientations [num_tx, 3]. Defaults
+            to the orientations used for tracing.
+        rx_orientations: New receiver orientations [num_rx, 3]. Defaults
+            to the orientations used for tracing.
+
+    Returns:
+        Coefficients `a` of shape [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths]
+    """
+    num_rx, num_tx, num_paths = frozen["tau"].shape
+    n = num_rx*num_tx*num_paths
+    tx_ind = np.broadcast_to(np.arange(num_tx)[None, :, None], (num_rx, num_tx, num_paths)).reshape(-1)
+    rx_ind = np.broadcast_to(np.arange(num_rx)[:, None, None], (num_rx, num_tx, num_paths)).reshape(-1)
+
+    if tx_orientations is None:
+        tx_orientations = frozen["tx_orientations"]
+    if rx_orientations is None:
+        rx_orientations = frozen["rx_orientations"]
+    tx_orientations = np.broadcast_to(np.asarray(tx_orientations, dtype=np.float32), (num_tx, 3))
+    rx_orientations = np.broadcast_to(np.asarray(rx_orientations, dtype=np.float32), (num_rx, 3))
+
+    # [N, 3]
+    k_t = _unit_vectors(frozen["theta_t"], frozen["phi_t"]).reshape(n, 3)
+    k_r = _unit_vectors(frozen["theta_r"], frozen["phi_r"]).reshape(n, 3)
+
+    # Transfer matrices from the probe coefficients: A = U^H T V
+    probe_patterns = probe_array().antenna_pattern.patterns
+    # [N, 2 (component), 2 (probe)]
+    v_probe = _world_patterns(probe_patterns, frozen["tx_orientations"][tx_ind], k_t, "out").transpose(1, 2, 0)
+    u_probe = _world_patterns(probe_patterns, frozen["rx_orientations"][rx_ind], k_r, "in").transpose(1, 2, 0)
+    # [N, 2 (rx probe), 2 (tx probe)]
+    a_probe = frozen["a_probe"].transpose(0, 2, 4, 1, 3).reshape(n, 2, 2)
+    t = np.linalg.inv(np.conj(u_probe).transpose(0, 2, 1)) @ a_probe @ np.linalg.inv(v_probe)
+
+    # New patterns, [num_patterns, N, 2]
+    v = _world_patterns(tx_array.antenna_pattern.patterns, tx_orientations[tx_ind], k_t, "out")
+    u = _world_patterns(rx_array.antenna_pattern.patterns, rx_orientations[rx_ind], k_r, "in")
+    # [num_rx_patterns, num_tx_patterns, N]
+    a = np.einsum("rni,nij,tnj->rtn", np.conj(u), t, v)
+    a = a.reshape(a.shape[0], a.shape[1], num_rx, num_tx, num_paths)
+
+    # Synthetic array phase shifts
+    wavelength = float(frozen["wavelength"])
+    # [num_tx, tx_array_size, 3], [num_rx, rx_array_size, 3]
+    d_tx = _array_offsets(tx_array, wavelength, tx_orientations)
+    d_rx = _array_offsets(rx_array, wavelength, rx_orientations)
+    k_t = k_t.reshape(num_rx, num_tx, num_paths, 3)
+    k_r = k_r.reshape(num_rx, num_tx, num_paths, 3)
+    # [num_rx, num_tx, tx_array_size, num_paths], [num_rx, rx_array_size, num_tx, num_paths]
+    phase_tx = np.einsum("rtpc,tec->rtep", k_t, d_tx)
+    phase_rx = np.einsum("rtpc,rec->retp", k_r, d_rx)
+    # [num_rx, rx_array_size, num_tx, tx_array_size, num_paths]
+    phase = phase_rx[:, :, :, None, :] + phase_tx[:, None, :, :, :]
+    shift = np.exp(2j*np.pi*phase/wavelength)
+
+    # [num_rx, num_rx_patterns, rx_array_size, num_tx, num_tx_patterns, tx_array_size, num_paths]
+    a = a.transpose(2, 0, 3, 1, 4)[:, :, None, :, :, None, :]*shift[:, None, :, :, None, :, :]
+    a = np.where(frozen["tau"][:, None, None, :, None, None, :] < 0, 0, a)
+    num_rx_ant = a.shape[1]*a.shape[2]
+    num_tx_ant = a.shape[4]*a.shape[5]
+    return a.reshape(num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths).astype(np.complex64)
+
+
+def _planar_array(settings: dict, loader: SionnaLoader) -> rt.PlanarArray:
+    """Builds a planar array from the antenna array settings of the input file"""
+    pattern = settings["pattern"]
+    if isinstance(pattern, dict):
+        pattern = loader.register_antenna_patterns(pattern["custom"])[0]
+    elif pattern.endswith(".py"):
+        pattern = loader.register_antenna_patterns(pattern)[0]
+    polarization = settings["polarization"]
+    if isinstance(polarization, dict):
+        polarization = loader.register_polarizations(polarization["custom"])
+    polarization_model = settings["polarization_model"]
+    if isinstance(polarization_model, dict):
+        polarization_model = loader.register_polarization_models(polarization_model["custom"])
+    return rt.PlanarArray(num_rows=settings["num_rows"],
+                          num_cols=settings["num_cols"],
+                          vertical_spacing=settings["vertical_spacing"],
+                          horizontal_spacing=settings["horizontal_spacing"],
+                          pattern=pattern,
+                          polarization=polarization,
+                          polarization_model=polarization_model)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-evaluate frozen Sionna RT paths for other antennas without retracing")
+    parser.add_argument("-i", "--inputfile", type=str, required=True, help=f"Path to a {FROZEN_PATHS_FILE} file")
+    parser.add_argument("-o", "--outputfolder", type=str, required=True, help="Folder for the re-evaluated summary.json")
+    for side in ["tx", "rx"]:
+        parser.add_argument(f"--{side}-pattern", type=str, default=None,
+                            help="Antenna pattern name or path to a custom pattern file")
+        parser.add_argument(f"--{side}-polarization", type=str, default=None)
+        parser.add_argument(f"--{side}-polarization-model", type=str, default=None)
+        parser.add_argument(f"--{side}-rows", type=int, default=None)
+        parser.add_argument(f"--{side}-cols", type=int, default=None)
+        parser.add_argument(f"--{side}-orientation", type=float, nargs=3, default=None,
+                            help="Orientation [rad] applied to all devices")
+    args = parser.parse_args(argv)
+
+    frozen = load_frozen_paths(args.inputfile)
+    loader = SionnaLoader()
+    arrays = {}
+    orientations = {}
+    for side in ["tx", "rx"]:
+        settings = dict(frozen[f"{side}_array"])
+        for key, arg in [("pattern", "pattern"), ("polarization", "polarization"),
+                         ("polarization_model", "polarization_model"), ("num_rows", "rows"), ("num_cols", "cols")]:
+            value = getattr(args, f"{side}_{arg}")
+            if value is not None:
+                settings[key] = value
+        arrays[side] = _planar_array(settings, loader)
+        orientations[side] = getattr(args, f"{side}_orientation")
+
+    a = reevaluate(frozen, arrays["tx"], arrays["rx"], orientations["tx"], orientations["rx"])
+    channels = ch.compute_channels(a, frozen["tau"], float(frozen["frequency"]), frozen["solver_settings"])
+
+    os.makedirs(args.outputfolder, exist_ok=True)
+    summary = {
+        "type": "Path",
+        "a": channels["a"].tolist(),
+        "tau": (channels["tau"]/1e-9).tolist(),
+        "h_freq": channels["h_freq"].tolist(),
+        "taps": channels["taps"].tolist(),
+        "image": None,
+    }
+    path = write_summary(args.outputfolder, summary)
+    logger.info(f"Wrote re-evaluated channels to {path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
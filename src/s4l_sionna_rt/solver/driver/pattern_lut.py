@@ -0,0 +1,255 @@
+"""
+Lookup-table acceleration of antenna and scattering patterns.
+
+Custom antenna and scattering patterns are arbitrary functions evaluated for
+every ray interaction, which is slow for patterns interpolated from
+measurement data. A pattern is sampled once on a regular grid and replaced by
+an interpolation of the samples, which costs a few gathers per evaluation.
+
+Antenna patterns are tabulated over theta in [0, pi] including both poles and
+phi in [-pi, pi), periodic in phi, with bilinear interpolation of C_theta and
+C_phi. Scattering patterns are tabulated over the incidence and scattering
+angles to the surface normal in [0, pi/2] and the azimuth difference of the
+two directions in [-pi, pi), with trilinear interpolation. This assumes that
+the scattering pattern does not depend on the azimuth of the incident wave,
+as the patterns built into Sionna; the accuracy check also draws random
+incident azimuths and reveals patterns for which this does not hold.
+"""
+
+import logging
+import time
+from typing import Callable, Optional
+
+import numpy as np
+import drjit as dr
+import mitsuba as mi
+from sionna.rt import AntennaPattern, ScatteringPattern
+
+logger = logging.getLogger(__name__)
+
+def lut_shape(lut, label: str) -> Optional[tuple]:
+    """
+    LUT grid of the input file, or None if tabulation is off (all entries 0).
+    Grids with an entry below 2 are ignored with a warning.
+    """
+    shape = tuple(int(n) for n in lut)
+    if all(n == 0 for n in shape):
+        return None
+    if min(shape) < 2:
+        logger.warning(f"{label}: LUT {shape} ignored, every entry must be at least 2")
+        return None
+    return shape
+
+
+def sample_pattern(pattern: Callable, num_theta: int, num_phi: int):
+    """
+    Samples one polarization direction of an antenna pattern on the LUT grid.
+
+    Returns:
+        A tuple (c_theta, c_phi) of complex arrays [num_theta, num_phi]
+    """
+    theta = dr.linspace(mi.Float, 0, dr.pi, num_theta, True)
+    phi = dr.linspace(mi.Float, -dr.pi, dr.pi, num_phi, False)
+    theta, phi = dr.meshgrid(theta, phi, indexing="ij")
+    c_theta, c_phi = pattern(theta, phi)
+    return tuple((dr.real(c).numpy() + 1j*dr.imag(c).numpy()).reshape(num_theta, num_phi)
+                 for c in (c_theta, c_phi))
+
+
+def lut_pattern(c_theta: np.ndarray, c_phi: np.ndarray) -> Callable:
+    """
+    Pattern function interpolating sampled values bilinearly.
+
+    Args:
+        c_theta: Zenith pattern on the LUT grid [num_theta, num_phi]
+        c_phi: Azimuth pattern on the LUT grid [num_theta, num_phi]
+    """
+    num_theta, num_phi = c_theta.shape
+    if num_theta < 2 or num_phi < 2:
+        raise ValueError(f"LUT needs at least 2 samples per angle, got ({num_theta}, {num_phi})")
+    tables = [mi.Float(np.ascontiguousarray(f(c)).reshape(-1).astype(np.float32))
+              for c in (c_theta, c_phi) for f in (np.real, np.imag)]
+    d_theta = np.pi/(num_theta - 1)
+    d_phi = 2*np.pi/num_phi
+
+    def f(theta, phi):
+        u = dr.clip(theta/d_theta, 0, num_theta - 1)
+        i0 = dr.minimum(mi.UInt32(dr.floor(u)), num_theta - 2)
+        wu = u - mi.Float(i0)
+
+        # Wrap phi to [-pi, pi)
+        v = (phi + dr.pi)/d_phi
+        v = v - dr.floor(v/num_phi)*num_phi
+        j0 = dr.minimum(mi.UInt32(dr.floor(v)), num_phi - 1)
+        wv = v - mi.Float(j0)
+        j1 = dr.select(j0 + 1 == num_phi, 0, j0 + 1)
+
+        def interp(table):
+            v00 = dr.gather(mi.Float, table, i0*num_phi + j0)
+            v01 = dr.gather(mi.Float, table, i0*num_phi + j1)
+            v10 = dr.gather(mi.Float, table, (i0 + 1)*num_phi + j0)
+            v11 = dr.gather(mi.Float, table, (i0 + 1)*num_phi + j1)
+            return (1 - wu)*((1 - wv)*v00 + wv*v01) + wu*((1 - wv)*v10 + wv*v11)
+
+        re_t, im_t, re_p, im_p = [interp(t) for t in tables]
+        return mi.Complex2f(re_t, im_t), mi.Complex2f(re_p, im_p)
+
+    return f
+
+
+def max_interpolation_error(pattern: Callable, lut: Callable, num_theta: int, num_phi: int) -> float:
+    """
+    Largest error of the LUT at the cell centers of the grid, where the
+    interpolation error is largest, relative to the peak of the pattern
+    """
+    theta = dr.linspace(mi.Float, 0.5*np.pi/(num_theta - 1), np.pi - 0.5*np.pi/(num_theta - 1), num_theta - 1, True)
+    phi = dr.linspace(mi.Float, -np.pi + np.pi/num_phi, np.pi - np.pi/num_phi, num_phi, True)
+    theta, phi = dr.meshgrid(theta, phi, indexing="ij")
+    error = 0.
+    peak = 0.
+    for c, c_lut in zip(pattern(theta, phi), lut(theta, phi)):
+        error = max(error, float(dr.max(dr.abs(c - c_lut))[0]))
+        peak = max(peak, float(dr.max(dr.abs(c))[0]))
+    return error/peak if peak > 0 else error
+
+
+class LUTAntennaPattern(AntennaPattern):
+    """
+    Antenna pattern tabulated from another pattern.
+
+    Args:
+        pattern: Antenna pattern to tabulate
+        num_theta: Number of zenith samples, including both poles
+        num_phi: Number of azimuth samples
+    """
+
+    def __init__(self, pattern: AntennaPattern, num_theta: int, num_phi: int):
+        super().__init__()
+        start = time.perf_counter()
+        patterns = []
+        self.max_error = 0.
+        for p in pattern.patterns:
+            lut = lut_pattern(*sample_pattern(p, num_theta, num_phi))
+            self.max_error = max(self.max_error, max_interpolation_error(p, lut, num_theta, num_phi))
+            patterns.append(lut)
+        self.patterns = patterns
+        logger.info(f"Tabulated antenna pattern on {num_theta}x{num_phi} (theta, phi) samples in "
+                    f"{time.perf_counter() - start:.3f} s, max. interpolation error "
+                    f"{100*self.max_error:.3g}% of the peak")
+
+
+def tabulated_factory(factory: Callable, num_theta: int, num_phi: int) -> Callable:
+    """
+    Wraps an antenna pattern factory so that the patterns it creates are
+    tabulated. Patterns are tabulated once per polarization and polarization
+    model.
+    """
+    patterns = {}
+
+    def f(*, polarization, polarization_model="tr38901_2"):
+        # Custom polarizations are lists of names
+        key = (str(polarization), str(polarization_model))
+        if key not in patterns:
+            patterns[key] = LUTAntennaPattern(factory(polarization=polarization, polarization_model=polarization_model),
+                                              num_theta, num_phi)
+        return patterns[key]
+
+    return f
+
+
+def _vector(x, y, z) -> mi.Vector3f:
+    return mi.Vector3f(*[mi.Float(np.asarray(c, dtype=np.float32).reshape(-1)) for c in (x, y, z)])
+
+
+def _scattering_angles(k_i, k_o):
+    """Incidence angle, scattering angle and azimuth difference of local directions"""
+    theta_i = dr.acos(dr.clip(dr.abs(k_i.z), 0, 1))
+    theta_o = dr.acos(dr.clip(dr.abs(k_o.z), 0, 1))
+    delta_phi = dr.atan2(k_o.y, k_o.x) - dr.atan2(k_i.y, k_i.x)
+    return theta_i, theta_o, delta_phi
+
+
+class TabulatedScatteringPattern(ScatteringPattern):
+    """
+    Scattering pattern tabulated from another pattern.
+
+    Args:
+        pattern: Scattering pattern to tabulate
+        num_theta_i: Number of incidence angle samples in [0, pi/2]
+        num_theta_o: Number of scattering angle samples in [0, pi/2]
+        num_phi: Number of azimuth difference samples in [-pi, pi)
+        num_check: Number of random direction pairs of the accuracy check
+    """
+
+    def __init__(self, pattern: ScatteringPattern, num_theta_i: int, num_theta_o: int, num_phi: int,
+                 num_check: int = 100000):
+        if min(num_theta_i, num_theta_o, num_phi) < 2:
+            raise ValueError(f"LUT needs at least 2 samples per angle, got ({num_theta_i}, {num_theta_o}, {num_phi})")
+        start = time.perf_counter()
+        self._shape = (num_theta_i, num_theta_o, num_phi)
+        self._d_theta_i = 0.5*np.pi/(num_theta_i - 1)
+        self._d_theta_o = 0.5*np.pi/(num_theta_o - 1)
+        self._d_phi = 2*np.pi/num_phi
+
+        theta_i, theta_o, delta_phi = np.meshgrid(np.linspace(0, 0.5*np.pi, num_theta_i),
+                                                  np.linspace(0, 0.5*np.pi, num_theta_o),
+                                                  np.linspace(-np.pi, np.pi, num_phi, endpoint=False),
+                                                  indexing="ij")
+        # Incident direction in the x-z plane, propagating towards the surface
+        k_i = _vector(np.sin(theta_i), np.zeros_like(theta_i), -np.cos(theta_i))
+        k_o = _vector(np.sin(theta_o)*np.cos(delta_phi), np.sin(theta_o)*np.sin(delta_phi), np.cos(theta_o))
+        self._table = mi.Float(pattern(k_i, k_o))
+
+        # Accuracy check at random direction pairs, including the incident azimuth
+        rng = np.random.default_rng(0)
+        angles = rng.random((4, num_check))*np.array([[0.5*np.pi], [2*np.pi], [0.5*np.pi], [2*np.pi]])
+        k_i = _vector(np.sin(angles[0])*np.cos(angles[1]), np.sin(angles[0])*np.sin(angles[1]), -np.cos(angles[0]))
+        k_o = _vector(np.sin(angles[2])*np.cos(angles[3]), np.sin(angles[2])*np.sin(angles[3]), np.cos(angles[2]))
+        reference = pattern(k_i, k_o)
+        peak = float(dr.max(dr.abs(reference))[0])
+        error = float(dr.max(dr.abs(self(k_i, k_o) - reference))[0])
+        self.max_error = error/peak if peak > 0 else error
+        logger.info(f"Tabulated scattering pattern on {num_theta_i}x{num_theta_o}x{num_phi} "
+                    f"(theta_i, theta_s, phi) samples in {time.perf_counter() - start:.3f} s, "
+                    f"max. interpolation error {100*self.max_error:.3g}% of the peak")
+
+    def __call__(self, ki_local: mi.Vector3f, ko_local: mi.Vector3f) -> mi.Float:
+        num_theta_i, num_theta_o, num_phi = self._shape
+        theta_i, theta_o, delta_phi = _scattering_angles(ki_local, ko_local)
+
+        u = dr.clip(theta_i/self._d_theta_i, 0, num_theta_i - 1)
+        i0 = dr.minimum(mi.UInt32(dr.floor(u)), num_theta_i - 2)
+        wu = u - mi.Float(i0)
+        v = dr.clip(theta_o/self._d_theta_o, 0, num_theta_o - 1)
+        j0 = dr.minimum(mi.UInt32(dr.floor(v)), num_theta_o - 2)
+        wv = v - mi.Float(j0)
+        # Wrap the azimuth difference to [-pi, pi)
+        w = (delta_phi + dr.pi)/self._d_phi
+        w = w - dr.floor(w/num_phi)*num_phi
+        k0 = dr.minimum(mi.UInt32(dr.floor(w)), num_phi - 1)
+        ww = w - mi.Float(k0)
+        k1 = dr.select(k0 + 1 == num_phi, 0, k0 + 1)
+
+        value = mi.Float(0.)
+        for i, wi in ((i0, 1 - wu), (i0 + 1, wu)):
+            for j, wj in ((j0, 1 - wv), (j0 + 1, wv)):
+                for k, wk in ((k0, 1 - ww), (k1, ww)):
+                    index = (i*num_theta_o + j)*num_phi + k
+                    value += wi*wj*wk*dr.gather(mi.Float, self._table, index)
+        return value
+
+
+def tabulated_scattering_factory(factory: Callable, num_theta_i: int, num_theta_o: int, num_phi: int) -> Callable:
+    """
+    Wraps a scattering pattern factory so that the patterns it creates are
+    tabulated. Patterns are tabulated once per set of pattern parameters.
+    """
+    patterns = {}
+
+    def f(**kwargs):
+        key = repr(sorted(kwargs.items()))
+        if key not in patterns:
+            patterns[key] = TabulatedScatteringPattern(factory(**kwargs), num_theta_i, num_theta_o, num_phi)
+        return patterns[key]
+
+    return f
@@ -0,0 +1,147 @@
+"""
+On-disk cache of per-transmitter radio maps.
+
+The path gain map of a transmitter only depends on the scene, on the
+transmitter itself (position, orientation and array), on the solver
+parameters and on the cell grid. Caching it under a hash of these inputs
+allows the RadioMap solver to trace only the transmitters that were added
+or changed since the previous run.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Default cache folder, inside the results folder
+RADIO_MAP_CACHE_DIR = "radio_map_cache"
+
+# Solver parameters that change the traced path gain
+RADIO_MAP_SOLVER_KEYS = ["samples", "max_depth", "los", "specular_reflection", "diffuse_reflection",
+                         "refraction", "seed", "rr_depth", "rr_prob", "stop_threshold"]
+
+
+def _file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _with_file_digests(obj):
+    """
+    Replaces every string that points to an existing file by the file path
+    and a digest of its content, so that edited input files invalidate the cache.
+    """
+    if isinstance(obj, dict):
+        return {k: _with_file_digests(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_with_file_digests(v) for v in obj]
+    if isinstance(obj, str) and os.path.isfile(obj):
+        return {"file": obj, "sha256": _file_digest(obj)}
+    return obj
+
+
+def _digest(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class RadioMapCache:
+    """
+    Stores the path gain map of each transmitter as a NumPy file named
+    after the hash of everything that determines it. The file modification
+    time records the last use, the least recently used maps are evicted
+    once the cache grows beyond `max_bytes` (0: unlimited).
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def digest(obj) -> str:
+        """Hash of JSON-like input parameters, including the content of the files they point to"""
+        return _digest(_with_file_digests(obj))
+
+    @staticmethod
+    def scene_hash(scene_params: dict) -> str:
+        """Hash of the scene geometry, materials and carrier frequency"""
+        return _digest(_with_file_digests({
+            "base_scene": scene_params["base_scene"],
+            "materials": scene_params["Materials"],
+            "frequency": scene_params["Setup_settings"]["frequency"],
+        }))
+
+    @staticmethod
+    def key(scene_hash: str, transmitter: dict, tx_array: dict, solver_settings: dict) -> str:
+        """
+        Cache key of a transmitter radio map.
+
+        Args:
+            scene_hash: Hash returned by scene_hash()
+            transmitter: Transmitter parameters from the input file
+            tx_array: Transmitter antenna array parameters from the input file
+            solver_settings: RadioMap solver settings from the input file
+        """
+        return _digest(_with_file_digests({
+            "scene": scene_hash,
+            "position": transmitter["position"],
+            "localization": transmitter["localization"],
+            "tx_array": tx_array,
+            "solver": {k: solver_settings[k] for k in RADIO_MAP_SOLVER_KEYS},
+            "grid": {"cell_size": solver_settings["cell_size"], "resizing": solver_settings["resizing"]},
+        }))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def load(self, key: str) -> Optional[np.ndarray]:
+        """Returns the cached path gain map [num_cells_y, num_cells_x] or None"""
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            path_gain = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable radio map cache entry {path}: {e}")
+            return None
+        return path_gain
+
+    def store(self, key: str, path_gain: np.ndarray) -> None:
+        """Stores a path gain map, writing through a temporary file"""
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "wb") as fh:
+            np.save(fh, np.asarray(path_gain, dtype=np.float32))
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used maps until the cache fits in `max_bytes`"""
+        if self.max_bytes <= 0:
+            return
+        entries = []
+        for f in os.listdir(self.cache_dir):
+            if f.endswith(".npy"):
+                try:
+                    st = os.stat(os.path.join(self.cache_dir, f))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, f))
+        total = sum(e[1] for e in entries)
+        for _, size, f in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, f))
+            except OSError:
+                continue
+            total -= size
+            logger.info(f"Evicted radio map cache entry {f}")
@@ -0,0 +1,300 @@
+"""
+Post-solve helpers for radio maps.
+
+The received signal strength and the SINR of a radio map are deterministic
+functions of the per-transmitter path gain, the transmit powers and the thermal
+noise. These helpers recompute them from a stored ``path_gain`` tensor so that
+power planning iterations do not require a new ray tracing run. The maps can
+also be queried at arbitrary positions. They only depend on NumPy, so they can
+be used from the solver, the extractor and the command line.
+"""
+
+import argparse
+import json
+import logging
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+from scipy.constants import Boltzmann
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("path_gain", "rss", "sinr")
+
+
+def dbm_to_watt(p_dbm) -> np.ndarray:
+    """Converts a power in dBm to Watt"""
+    return np.power(10., (np.asarray(p_dbm, dtype=np.float64) - 30.)/10.)
+
+
+def thermal_noise_power(bandwidth: float, temperature: float) -> float:
+    """Thermal noise power [W] for the given bandwidth [Hz] and temperature [K]"""
+    return Boltzmann*temperature*bandwidth
+
+
+def recompute_rss_sinr(path_gain, power_dbm, bandwidth: float, temperature: float,
+                       active: Optional[Sequence[int]] = None):
+    """
+    Recomputes the RSS and SINR maps from the per-transmitter path gain.
+
+    Args:
+        path_gain: Path gain maps with shape [num_tx, num_cells_y, num_cells_x]
+        power_dbm: Transmit power in dBm, either one value for all
+            transmitters or one value per transmitter
+        bandwidth: Bandwidth [Hz] used for the thermal noise
+        temperature: Temperature [K] used for the thermal noise
+        active: Indices of the transmitters that are switched on. Inactive
+            transmitters neither serve nor interfere. `None` activates all.
+
+    Returns:
+        A tuple (rss, sinr) of arrays with the same shape as ``path_gain``
+    """
+    path_gain = np.asarray(path_gain, dtype=np.float64)
+    num_tx = path_gain.shape[0]
+
+    power = np.broadcast_to(dbm_to_watt(power_dbm), (num_tx,)).copy()
+    if active is not None:
+        mask = np.zeros(num_tx, dtype=bool)
+        mask[list(active)] = True
+        power[~mask] = 0.
+
+    rss = path_gain*power[:, None, None]
+    # Numerical issues can make the interference slightly negative
+    interference = np.maximum(rss.sum(axis=0, keepdims=True) - rss, 0.)
+    sinr = rss/(interference + thermal_noise_power(bandwidth, temperature))
+
+    return rss.astype(np.float32), sinr.astype(np.float32)
+
+
+def cdf(values, num_points: int = 101) -> dict:
+    """
+    Compact empirical CDF: the quantiles of the finite values at
+    `num_points` equally spaced probabilities.
+    """
+    values = np.asarray(values, dtype=np.float64).reshape(-1)
+    values = values[np.isfinite(values)]
+    probability = np.linspace(0., 1., num_points)
+    if values.size == 0:
+        return {"probability": probability.tolist(), "value": [None]*num_points}
+    return {"probability": probability.tolist(), "value": np.quantile(values, probability).tolist()}
+
+
+def kpi_maps(rss, bandwidth: float, temperature: float, thresholds_db: Sequence[float] = (0.,)) -> dict:
+    """
+    Best-server maps and coverage statistics, in one pass over the transmitters.
+
+    Every cell is served by the transmitter with the strongest RSS, all
+    other transmitters interfere.
+
+    Args:
+        rss: RSS maps [num_tx, num_cells_y, num_cells_x] [W]
+        bandwidth: Bandwidth [Hz], for the noise power and the capacity
+        temperature: Temperature [K] used for the thermal noise
+        thresholds_db: SINR thresholds of the coverage probability [dB]
+
+    Returns:
+        Dictionary with the maps [num_cells_y, num_cells_x]
+        ``serving_cell`` (-1 for cells without signal), ``best_rss`` [dBm],
+        ``best_sinr`` [dB] and ``capacity`` [bit/s], the fraction of cells
+        whose best-server SINR exceeds each threshold (``coverage``) and the
+        CDFs of the three maps over the cells with signal
+    """
+    rss = np.asarray(rss, dtype=np.float64)
+    serving_cell = np.argmax(rss, axis=0)
+    best_rss = np.take_along_axis(rss, serving_cell[None], axis=0)[0]
+    serving_cell = np.where(best_rss > 0, serving_cell, -1)
+
+    interference = np.maximum(rss.sum(axis=0) - best_rss, 0.)
+    best_sinr = best_rss/(interference + thermal_noise_power(bandwidth, temperature))
+    capacity = bandwidth*np.log2(1. + best_sinr)
+
+    with np.errstate(divide="ignore"):
+        best_rss_dbm = 10.*np.log10(best_rss) + 30.
+        best_sinr_db = 10.*np.log10(best_sinr)
+    covered = serving_cell >= 0
+
+    thresholds_db = [float(t) for t in thresholds_db]
+    return {
+        "serving_cell": serving_cell.astype(np.int16),
+        "best_rss": best_rss_dbm.astype(np.float32),
+        "best_sinr": best_sinr_db.astype(np.float32),
+        "capacity": capacity.astype(np.float32),
+        "thresholds_db": thresholds_db,
+        "coverage": [float(np.mean(best_sinr > 10.**(t/10.))) for t in thresholds_db],
+        "cdf": {"best_rss": cdf(best_rss_dbm[covered]),
+                "best_sinr": cdf(best_sinr_db[covered]),
+                "capacity": cdf(capacity[covered])},
+    }
+
+
+def kpi_summary(kpi: dict) -> dict:
+    """KPI maps in JSON form, non-finite dB values as None"""
+    return {k: np.where(np.isfinite(v), v, None).tolist() if isinstance(v, np.ndarray) and v.dtype.kind == "f"
+            else v.tolist() if isinstance(v, np.ndarray) else v
+            for k, v in kpi.items()}
+
+
+def parse_thresholds(text: str) -> list:
+    """Parses thresholds written as ``-5, 0, 5``"""
+    return [float(t) for t in text.replace(";", ",").split(",") if t.strip()]
+
+
+def update_summary(summary: dict, power_dbm=None, bandwidth: Optional[float] = None,
+                   temperature: Optional[float] = None,
+                   active: Optional[Sequence[int]] = None) -> dict:
+    """
+    Returns a copy of a RadioMap summary with the RSS and SINR recomputed.
+
+    Parameters that are not given are taken from the summary itself.
+    """
+    if summary.get("type") != "RadioMap":
+        raise ValueError("Only RadioMap results can be recomputed")
+
+    power_dbm = summary["power_dbm"] if power_dbm is None else power_dbm
+    bandwidth = summary["bandwidth"] if bandwidth is None else bandwidth
+    temperature = summary["temperature"] if temperature is None else temperature
+
+    rss, sinr = recompute_rss_sinr(summary["path_gain"], power_dbm, bandwidth, temperature, active)
+
+    updated = dict(summary)
+    updated.update({
+        "rss": rss.tolist(),
+        "sinr": sinr.tolist(),
+        "power_dbm": np.broadcast_to(np.asarray(power_dbm, dtype=float), (rss.shape[0],)).tolist(),
+        "bandwidth": bandwidth,
+        "temperature": temperature,
+        "active_tx": None if active is None else list(active),
+    })
+    if "kpi" in summary:
+        updated["kpi"] = kpi_summary(kpi_maps(rss, bandwidth, temperature, summary["kpi"]["thresholds_db"]))
+    if "receiver_values" in summary:
+        receiver_values = summary["receiver_values"]
+        if "positions" in receiver_values:
+            values = query(updated, receiver_values["positions"], ["rss", "sinr"])
+            updated["receiver_values"] = {**receiver_values, **{k: v.tolist() for k, v in values.items()}}
+        else:
+            # Summaries written before the receiver positions were stored cannot be updated
+            del updated["receiver_values"]
+    return updated
+
+
+def rotation_matrix(orientation) -> np.ndarray:
+    """Rotation matrix of the angles (alpha, beta, gamma) [rad], as sionna.rt.utils.rotation_matrix"""
+    a, b, c = orientation
+    rz = np.array([[np.cos(a), -np.sin(a), 0.], [np.sin(a), np.cos(a), 0.], [0., 0., 1.]])
+    ry = np.array([[np.cos(b), 0., np.sin(b)], [0., 1., 0.], [-np.sin(b), 0., np.cos(b)]])
+    rx = np.array([[1., 0., 0.], [0., np.cos(c), -np.sin(c)], [0., np.sin(c), np.cos(c)]])
+    return rz @ ry @ rx
+
+
+def world_to_cell(points, center, orientation, size, cell_size) -> tuple:
+    """
+    Maps positions to continuous cell coordinates of a radio map, such that
+    the center of cell [i, j] is at (x, y) = (j, i).
+
+    Positions are projected onto the measurement plane along its normal.
+
+    Args:
+        points: Positions [num_points, 3]
+        center: Center of the radio map [m]
+        orientation: Orientation (alpha, beta, gamma) of the radio map [rad]
+        size: Size (x, y) of the radio map [m]
+        cell_size: Size (x, y) of a cell [m]
+
+    Returns:
+        A tuple (x, y) of cell coordinates [num_points]
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    # Row vectors: p @ R is R^T p, the inverse rotation
+    local = (points - np.asarray(center, dtype=np.float64)) @ rotation_matrix(orientation)
+    x = (local[:, 0] + 0.5*size[0])/cell_size[0] - 0.5
+    y = (local[:, 1] + 0.5*size[1])/cell_size[1] - 0.5
+    return x, y
+
+
+def interpolate(maps, x, y) -> np.ndarray:
+    """
+    Bilinear interpolation of maps at continuous cell coordinates.
+
+    Between the outermost cell centers and the map border, the value of the
+    outermost cell is used. Positions outside of the map get NaN.
+
+    Args:
+        maps: Maps [num_tx, num_cells_y, num_cells_x]
+        x: Cell coordinates along x [num_points]
+        y: Cell coordinates along y [num_points]
+
+    Returns:
+        Interpolated values [num_tx, num_points]
+    """
+    maps = np.asarray(maps, dtype=np.float64)
+    num_y, num_x = maps.shape[1:]
+    outside = (x < -0.5) | (x > num_x - 0.5) | (y < -0.5) | (y > num_y - 0.5)
+
+    x = np.clip(x, 0., num_x - 1.)
+    y = np.clip(y, 0., num_y - 1.)
+    x0 = np.minimum(np.floor(x).astype(int), max(num_x - 2, 0))
+    y0 = np.minimum(np.floor(y).astype(int), max(num_y - 2, 0))
+    x1 = np.minimum(x0 + 1, num_x - 1)
+    y1 = np.minimum(y0 + 1, num_y - 1)
+    wx = x - x0
+    wy = y - y0
+
+    values = ((1 - wy)*((1 - wx)*maps[:, y0, x0] + wx*maps[:, y0, x1])
+              + wy*((1 - wx)*maps[:, y1, x0] + wx*maps[:, y1, x1]))
+    values[:, outside] = np.nan
+    return values
+
+
+def query(summary: dict, points, metrics: Sequence[str] = METRICS) -> dict:
+    """
+    Values of the radio map of a RadioMap summary at arbitrary positions.
+
+    Args:
+        summary: RadioMap summary with the map geometry (center, orientation,
+            size, cell_size) and the requested metrics
+        points: Positions [num_points, 3]
+        metrics: Metrics to interpolate, out of "path_gain", "rss" and "sinr"
+
+    Returns:
+        Dictionary with the interpolated values [num_tx, num_points] of every
+        metric, NaN outside of the map
+    """
+    if summary.get("type") != "RadioMap" or "cell_size" not in summary:
+        raise ValueError("Radio map queries need a RadioMap summary with the map geometry")
+    x, y = world_to_cell(points, summary["center"], summary["orientation"], summary["size"], summary["cell_size"])
+    return {m: interpolate(summary[m], x, y) for m in metrics}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute RSS and SINR of a Sionna RT radio map without retracing")
+    parser.add_argument("-i", "--inputfile", type=str, required=True,
+                        help="Path to the summary.json of a RadioMap simulation")
+    parser.add_argument("-o", "--outputfile", type=str, default=None,
+                        help="Path of the updated summary (defaults to summary_whatif.json next to the input)")
+    parser.add_argument("--power-dbm", type=float, nargs="+", default=None,
+                        help="Transmit power in dBm, one value for all transmitters or one per transmitter")
+    parser.add_argument("--bandwidth", type=float, default=None, help="Bandwidth [Hz]")
+    parser.add_argument("--temperature", type=float, default=None, help="Temperature [K]")
+    parser.add_argument("--active", type=int, nargs="+", default=None,
+                        help="Indices of the active transmitters")
+    args = parser.parse_args(argv)
+
+    with open(args.inputfile, "r") as f:
+        summary = json.load(f)
+
+    updated = update_summary(summary, power_dbm=args.power_dbm, bandwidth=args.bandwidth,
+                             temperature=args.temperature, active=args.active)
+
+    outputfile = args.outputfile
+    if outputfile is None:
+        outputfile = os.path.join(os.path.dirname(os.path.abspath(args.inputfile)), "summary_whatif.json")
+    with open(outputfile, "w") as f:
+        json.dump(updated, f, indent=2)
+    logger.info(f"Wrote updated radio map to {outputfile}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,104 @@
+"""
+Creation of large receiver sets from position arrays.
+
+Receivers sampled from radio maps, imported point sets and measurement grids
+are created from (N, 3) position arrays. The names of the whole set are
+checked against the scene before any receiver is added.
+"""
+
+import logging
+from typing import Optional
+
+import numpy as np
+import sionna.rt as rt
+
+from s4l_sionna_rt.solver.driver.radio_map_utils import rotation_matrix
+
+logger = logging.getLogger(__name__)
+
+def grid_positions(center, size, spacing, orientation=(0., 0., 0.)) -> np.ndarray:
+    """
+    Cell centers of a rectangular grid, as the cells of a radio map.
+
+    Args:
+        center: Center of the grid [m]
+        size: Size (x, y) of the grid before rotation [m]
+        spacing: Distance (x, y) between grid points [m]
+        orientation: Rotation (alpha, beta, gamma) of the grid [rad], applied
+            as for Sionna radio maps (Z, Y, X)
+
+    Returns:
+        Positions [num_points, 3], row by row along y
+    """
+    num_x = max(1, int(np.floor(size[0]/spacing[0])))
+    num_y = max(1, int(np.floor(size[1]/spacing[1])))
+    x = (np.arange(num_x) + 0.5)*spacing[0] - num_x*spacing[0]/2
+    y = (np.arange(num_y) + 0.5)*spacing[1] - num_y*spacing[1]/2
+    x, y = np.meshgrid(x, y)
+    local = np.stack([x.reshape(-1), y.reshape(-1), np.zeros(x.size)], axis=-1)
+    return local @ rotation_matrix(orientation).T + np.asarray(center, dtype=np.float64)
+
+
+def load_positions(filename: str) -> np.ndarray:
+    """
+    Loads a point set from a .npy file or from a CSV file with the columns
+    x,y,z (a header line is skipped).
+
+    Returns:
+        Positions [num_points, 3]
+    """
+    if filename.endswith(".npy"):
+        positions = np.load(filename)
+    else:
+        try:
+            positions = np.loadtxt(filename, delimiter=",", ndmin=2)
+        except ValueError:
+            positions = np.loadtxt(filename, delimiter=",", ndmin=2, skiprows=1)
+    positions = np.asarray(positions, dtype=np.float64)
+    if positions.ndim != 2 or positions.shape[1] != 3:
+        raise ValueError(f"{filename}: expected positions of shape (N, 3), got {positions.shape}")
+    return positions
+
+
+def positions_from_settings(settings: dict) -> np.ndarray:
+    """Positions of the receiver set settings of the Path solver"""
+    if settings["source"] == "file":
+        if settings["points_file"] is None:
+            raise ValueError("Receiver set: no points file selected")
+        return load_positions(settings["points_file"])
+    return grid_positions(settings["grid_center"], settings["grid_size"], settings["grid_spacing"],
+                          settings["grid_orientation"])
+
+
+def add_receivers(scene, positions, prefix: str = "rx", velocities: Optional[np.ndarray] = None,
+                  orientation=(0., 0., 0.)) -> list:
+    """
+    Creates one receiver per position and adds them to the scene.
+
+    Args:
+        scene: Sionna RT scene
+        positions: Receiver positions [num_rx, 3]
+        prefix: Receivers are named "<prefix>-<index>"
+        velocities: Receiver velocities [num_rx, 3], or None for static receivers
+        orientation: Orientation shared by all receivers
+
+    Returns:
+        The created receivers, in the order of `positions`
+    """
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3).tolist()
+    if velocities is not None:
+        velocities = np.asarray(velocities, dtype=np.float32).reshape(-1, 3).tolist()
+
+    names = [f"{prefix}-{i}" for i in range(len(positions))]
+    taken = [n for n in names if scene.get(n) is not None]
+    if len(taken) != 0:
+        raise ValueError(f"Receiver names already used in the scene: {', '.join(taken[:5])}")
+
+    receivers = [rt.Receiver(name, position=p, orientation=orientation,
+                             velocity=None if velocities is None else velocities[i])
+                 for i, (name, p) in enumerate(zip(names, positions))]
+    for r in receivers:
+        scene.add(r)
+    logger.info(f"Added {len(receivers)} receivers '{prefix}-*'")
+    return receivers
+
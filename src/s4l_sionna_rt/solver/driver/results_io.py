@@ -0,0 +1,191 @@
+"""
+Serialization helpers shared by the solver and the post-solve tools.
+"""
+
+import json
+import os
+from typing import Optional
+
+import numpy as np
+from s4l_sionna_rt.solver.driver.channel_utils import expand_tau
+
+JSON_OUTPUT = "summary.json"
+SPARSE_CIR_OUTPUT = "cir_sparse.npz"
+CFR_OUTPUT = "h_freq.npy"
+# Paths traced to the positions sampled from a radio map
+SAMPLED_CIR_OUTPUT = "sampled_cir_sparse.npz"
+SAMPLED_CFR_OUTPUT = "sampled_h_freq.npy"
+MANIFEST_OUTPUT = "manifest.json"
+
+# Axis labels of the summary arrays, per solver type
+AXES = {
+    "RadioMap": {
+        "path_gain": ["tx", "cell_y", "cell_x"],
+        "rss": ["tx", "cell_y", "cell_x"],
+        "sinr": ["tx", "cell_y", "cell_x"],
+        "beam_gain": ["tx", "beam", "cell_y", "cell_x"],
+        "best_beam": ["tx", "cell_y", "cell_x"],
+        "best_beam_gain": ["tx", "cell_y", "cell_x"],
+        # Receivers sampled from the radio map
+        "h_freq": ["rx", "rx_ant", "tx", "tx_ant", "time", "subcarrier"],
+    },
+    "Path": {
+        "h_freq": ["rx", "rx_ant", "tx", "tx_ant", "time", "subcarrier"],
+        "a": ["rx", "rx_ant", "tx", "tx_ant", "path", "time"],
+        "tau": ["rx", "rx_ant", "tx", "tx_ant", "path"],
+        "taps": ["rx", "rx_ant", "tx", "tx_ant", "time", "tap"],
+        "beam_gain": ["rx", "tx", "beam"],
+        "best_beam": ["rx", "tx"],
+        "best_beam_gain": ["rx", "tx"],
+        "link_stats": ["rx", "tx"],
+    },
+}
+# Small summary entries copied to the manifest, enough to build the extractor UI
+MANIFEST_SCALARS = ("image", "db_scale", "vmin", "vmax", "power_dbm", "bandwidth", "temperature", "vtk_files")
+
+
+def custom_json(obj):
+    if isinstance(obj,complex):
+        return {'__complex__':True, 'real':obj.real, 'imag':obj.imag}
+
+
+def write_summary(output_dir: str, summary: dict, filename: str = JSON_OUTPUT) -> str:
+    """Writes the summary dictionary as JSON and returns its path"""
+    path = os.path.join(output_dir, filename)
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2, default=custom_json)
+    return path
+
+
+def build_manifest(summary: dict, shapes: Optional[dict] = None, tx_names: Optional[list] = None,
+                   rx_names: Optional[list] = None) -> dict:
+    """
+    Describes a summary without its bulk data: the available entries, the
+    shape and axis labels of every array, and the transmitter and receiver
+    names.
+
+    Args:
+        summary: Summary dictionary
+        shapes: Shapes of the arrays {name: shape}. Arrays not given here are
+            measured from the summary entries.
+        tx_names: Transmitter names, in the order of the tx axes
+        rx_names: Receiver names, in the order of the rx axes
+    """
+    shapes = dict(shapes or {})
+    axes = AXES.get(summary["type"], {})
+    arrays = {}
+    for name, labels in axes.items():
+        if name in shapes:
+            shape = list(shapes[name])
+        elif name == "link_stats" and name in summary:
+            shape = list(np.shape(summary[name]["total_power"]))
+        elif name in summary:
+            shape = list(np.shape(summary[name]))[:len(labels)]
+        else:
+            continue
+        if name == "tau" and len(shape) == 3:
+            # Synthetic arrays
+            labels = ["rx", "tx", "path"]
+        arrays[name] = {"shape": shape, "axes": labels}
+
+    def names(axis, prefix):
+        for a in arrays.values():
+            if axis in a["axes"]:
+                return [f"{prefix}-{i}" for i in range(a["shape"][a["axes"].index(axis)])]
+        return []
+
+    return {
+        "type": summary["type"],
+        "entries": list(summary.keys()),
+        "arrays": arrays,
+        "tx_names": list(tx_names) if tx_names is not None else summary.get("tx_names", names("tx", "tx")),
+        "rx_names": list(rx_names) if rx_names is not None else names("rx", "rx"),
+        **{k: summary[k] for k in MANIFEST_SCALARS if k in summary},
+    }
+
+
+def write_manifest(output_dir: str, manifest: dict) -> str:
+    return write_summary(output_dir, manifest, MANIFEST_OUTPUT)
+
+
+def load_manifest(output_dir: str) -> Optional[dict]:
+    """Returns the manifest of a results folder, or None for results written without one"""
+    path = os.path.join(output_dir, MANIFEST_OUTPUT)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def open_array_output(filename: str, shape: tuple, dtype=np.complex64) -> np.ndarray:
+    """Preallocates a .npy file on disk and returns it as a writable memory map"""
+    return np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=tuple(shape))
+
+
+def load_array(filename: str) -> np.ndarray:
+    """Opens a .npy output read-only, without loading it into memory"""
+    return np.load(filename, mmap_mode="r")
+
+
+def to_sparse_cir(a: np.ndarray, tau: np.ndarray) -> dict:
+    """
+    Packs a dense CIR into a CSR-style layout that keeps only valid paths.
+
+    A link is a (rx, rx_ant, tx, tx_ant) index, flattened in C order. The
+    paths of link l are the entries offsets[l]:offsets[l+1] of the packed
+    arrays, and path_index gives their slot in the dense path axis.
+
+    Args:
+        a: Coefficients [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths, num_time_steps]
+        tau: Delays [num_rx, num_rx_ant, num_tx, num_tx_ant, num_paths] or
+            [num_rx, num_tx, num_paths] for synthetic arrays. Invalid paths
+            have a negative delay.
+    """
+    a = np.asarray(a)
+    tau = np.broadcast_to(expand_tau(np.asarray(tau)), a.shape[:-1])
+    valid = tau >= 0
+    counts = valid.reshape(-1, a.shape[4]).sum(axis=1)
+    return {
+        "shape": np.array(a.shape, dtype=np.int64),
+        "offsets": np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        "path_index": np.nonzero(valid)[4].astype(np.int32),
+        "a": a[valid],
+        "tau": tau[valid],
+    }
+
+
+def save_sparse_cir(filename: str, sparse: dict) -> None:
+    np.savez(filename, **sparse)
+
+
+def load_sparse_cir(filename: str) -> dict:
+    with np.load(filename) as data:
+        return {k: data[k] for k in data.files}
+
+
+def sparse_cir_link(sparse: dict, index) -> tuple:
+    """
+    Valid paths of one link.
+
+    Args:
+        sparse: Sparse CIR as returned by to_sparse_cir()
+        index: Link index (rx, rx_ant, tx, tx_ant)
+
+    Returns:
+        A tuple (a, tau) of shapes [num_valid_paths, num_time_steps] and [num_valid_paths]
+    """
+    l = np.ravel_multi_index(tuple(index), tuple(sparse["shape"][:4]))
+    start, stop = sparse["offsets"][l], sparse["offsets"][l + 1]
+    return sparse["a"][start:stop], sparse["tau"][start:stop]
+
+
+def from_sparse_cir(sparse: dict) -> tuple:
+    """Restores the dense (a, tau), with zero coefficients and delays of -1 for padding"""
+    shape = tuple(sparse["shape"])
+    a = np.zeros(shape, dtype=sparse["a"].dtype)
+    tau = np.full(shape[:-1], -1., dtype=sparse["tau"].dtype)
+    link = np.repeat(np.arange(len(sparse["offsets"]) - 1), np.diff(sparse["offsets"]))
+    index = np.unravel_index(link, shape[:4]) + (sparse["path_index"],)
+    a[index] = sparse["a"]
+    tau[index] = sparse["tau"]
+    return a, tau
@@ -0,0 +1,105 @@
+"""
+Receiver trajectories for drive-test style simulations.
+
+A trajectory is given either as a polyline of waypoints or as a CSV file of
+waypoints with timestamps. It is resampled at a fixed spacing along the route
+and turned into receiver positions, travel distances, sample times and
+velocities, so that the whole route is solved in one PathSolver call and the
+velocities feed the Doppler shifts of the paths.
+"""
+
+import logging
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def parse_polyline(text: str) -> np.ndarray:
+    """
+    Parses waypoints written as ``x,y,z; x,y,z; ...``
+
+    Returns:
+        Waypoints [num_waypoints, 3]
+    """
+    points = [[float(c) for c in p.split(",")] for p in text.split(";") if p.strip()]
+    if len(points) == 0 or any(len(p) != 3 for p in points):
+        raise ValueError(f"Invalid polyline '{text}', expected 'x,y,z; x,y,z; ...'")
+    return np.array(points, dtype=np.float64)
+
+
+def load_waypoints(filename: str):
+    """
+    Loads waypoints from a CSV file with the columns ``t,x,y,z`` or ``x,y,z``.
+    A header line is skipped.
+
+    Returns:
+        A tuple (times, waypoints) with the timestamps [num_waypoints] or None
+        and the waypoints [num_waypoints, 3]
+    """
+    try:
+        data = np.loadtxt(filename, delimiter=",", ndmin=2)
+    except ValueError:
+        data = np.loadtxt(filename, delimiter=",", ndmin=2, skiprows=1)
+    if data.shape[1] == 4:
+        return data[:, 0], data[:, 1:]
+    if data.shape[1] == 3:
+        return None, data
+    raise ValueError(f"{filename}: expected 3 (x,y,z) or 4 (t,x,y,z) columns, got {data.shape[1]}")
+
+
+def resample(waypoints: np.ndarray, spacing: float, times: Optional[np.ndarray] = None):
+    """
+    Samples a route at a fixed spacing along its length. The last waypoint
+    is always included. With a spacing of 0, the waypoints are used as they are.
+
+    Args:
+        waypoints: Waypoints [num_waypoints, 3]
+        spacing: Distance between samples [m]
+        times: Timestamps of the waypoints, interpolated along the route
+
+    Returns:
+        A tuple (positions, distance, times) with the sample positions
+        [num_samples, 3], the travelled distance [num_samples] and the sample
+        times [num_samples] or None
+    """
+    distance = np.concatenate([[0.], np.cumsum(np.linalg.norm(np.diff(waypoints, axis=0), axis=1))])
+    if spacing > 0 and distance[-1] > 0:
+        samples = np.append(np.arange(0., distance[-1], spacing), distance[-1])
+    else:
+        samples = distance
+    positions = np.stack([np.interp(samples, distance, waypoints[:, k]) for k in range(3)], axis=-1)
+    if times is not None:
+        times = np.interp(samples, distance, times)
+    return positions, samples, times
+
+
+def velocities(positions: np.ndarray, times: Optional[np.ndarray]) -> np.ndarray:
+    """Velocities [num_samples, 3] from the sample times, zero for a static route"""
+    if times is None or len(times) < 2:
+        return np.zeros_like(positions)
+    if np.any(np.diff(times) <= 0):
+        raise ValueError("Trajectory timestamps must be strictly increasing")
+    return np.gradient(positions, times, axis=0)
+
+
+def trajectory_from_settings(settings: dict) -> dict:
+    """
+    Expands the trajectory settings of the Path solver.
+
+    Returns:
+        Dictionary with the sample `positions`, `distance`, `times` (None if
+        the route is static) and `velocities`
+    """
+    waypoints = settings["waypoints"]
+    if "csv" in waypoints:
+        times, points = load_waypoints(waypoints["csv"])
+    else:
+        times, points = None, parse_polyline(waypoints["polyline"])
+
+    positions, distance, times = resample(points, settings["spacing"], times)
+    if times is None and settings["speed"] > 0:
+        times = distance/settings["speed"]
+    logger.info(f"Trajectory: {len(points)} waypoints, {len(positions)} samples over {distance[-1]:.1f} m")
+    return {"positions": positions, "distance": distance, "times": times,
+            "velocities": velocities(positions, times)}
@@ -0,0 +1,192 @@
+"""
+Export of results as VTK files for the native field viewer of Sim4Life.
+
+Every radio map metric is written as a grid of the cells of the measurement
+plane, in world coordinates, with one cell array per transmitter in dB (dBm
+for the RSS). Axis-aligned radio maps are written as rectilinear grids
+(.vtr), rotated ones as structured grids (.vts). Cells without signal are NaN.
+
+Propagation paths are written as polylines from the source through the
+interaction points to the target (.vtp), one line per valid path. The points
+carry the interaction type (sionna.rt.constants.InteractionType, 0 at the
+sources and targets), the lines the path power in dB and the receiver,
+transmitter and path indices.
+"""
+
+import logging
+import os
+
+import numpy as np
+import pyvista as pv
+
+from s4l_sionna_rt.solver.driver.radio_map_utils import rotation_matrix
+
+logger = logging.getLogger(__name__)
+
+PATHS_OUTPUT = "paths.vtp"
+
+# Metric: (offset added to the dB values, unit)
+RADIO_MAP_METRICS = {
+    "path_gain": (0., "dB"),
+    "rss": (30., "dBm"),
+    "sinr": (0., "dB"),
+}
+
+
+def radio_map_grid(center, orientation, size, cell_size, num_cells) -> pv.DataSet:
+    """
+    Grid of the cells of a radio map, with the cell corners as points.
+
+    Args:
+        center: Center of the radio map [m]
+        orientation: Orientation (alpha, beta, gamma) of the radio map [rad]
+        size: Size (x, y) of the radio map [m]
+        cell_size: Size (x, y) of a cell [m]
+        num_cells: Number of cells (y, x)
+
+    Returns:
+        A pv.RectilinearGrid if the radio map is not rotated, a
+        pv.StructuredGrid otherwise. Cells are ordered as the flattened
+        [num_cells_y, num_cells_x] maps.
+    """
+    num_y, num_x = num_cells
+    x = np.arange(num_x + 1)*cell_size[0] - 0.5*size[0]
+    y = np.arange(num_y + 1)*cell_size[1] - 0.5*size[1]
+    center = np.asarray(center, dtype=np.float64)
+
+    if np.allclose(orientation, 0.):
+        return pv.RectilinearGrid(x + center[0], y + center[1], center[2:3])
+
+    x, y = np.meshgrid(x, y, indexing="ij")
+    local = np.stack([x, y, np.zeros_like(x)], axis=-1)
+    world = local @ rotation_matrix(orientation).T + center
+    return pv.StructuredGrid(*[world[..., i, None] for i in range(3)])
+
+
+def to_db(values: np.ndarray, offset: float = 0.) -> np.ndarray:
+    """Values in dB, NaN where there is no signal"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        db = 10*np.log10(np.asarray(values, dtype=np.float64)) + offset
+    return np.where(np.isfinite(db), db, np.nan).astype(np.float32)
+
+
+def write_radio_map(output_dir: str, maps: dict, summary: dict, tx_names: list) -> dict:
+    """
+    Writes every radio map metric as a VTK grid.
+
+    Args:
+        output_dir: Results folder
+        maps: Linear maps {metric: [num_tx, num_cells_y, num_cells_x]} of the
+            metrics of RADIO_MAP_METRICS
+        summary: Summary with the geometry of the radio map ("center",
+            "orientation", "size" and "cell_size")
+        tx_names: Transmitter names, used as array names
+
+    Returns:
+        The file names {metric: filename}, relative to `output_dir`
+    """
+    files = {}
+    for metric, values in maps.items():
+        offset, unit = RADIO_MAP_METRICS[metric]
+        grid = radio_map_grid(summary["center"], summary["orientation"], summary["size"], summary["cell_size"],
+                              values.shape[1:])
+        for name, v in zip(tx_names, values):
+            grid.cell_data[f"{name} [{unit}]"] = to_db(v, offset).reshape(-1)
+        filename = f"radio_map_{metric}" + (".vtr" if isinstance(grid, pv.RectilinearGrid) else ".vts")
+        grid.save(os.path.join(output_dir, filename))
+        files[metric] = filename
+    logger.info(f"Radio maps written as VTK grids: {', '.join(files.values())}")
+    return files
+
+
+def path_arrays(paths) -> dict:
+    """
+    Geometry and power of the paths of a sionna.rt.Paths object, with one
+    source per transmitter and one target per receiver for synthetic arrays,
+    or one per antenna otherwise.
+
+    Returns:
+        Dictionary with the arrays
+            vertices     [max_depth, num_targets, num_sources, num_paths, 3]
+            interactions [max_depth, num_targets, num_sources, num_paths]
+            valid        [num_targets, num_sources, num_paths]
+            sources      [num_sources, 3]
+            targets      [num_targets, 3]
+            power        [num_targets, num_sources, num_paths], |a|^2 summed
+                         over the antenna patterns (and synthetic array elements)
+    """
+    vertices = paths.vertices.numpy()
+    interactions = paths.interactions.numpy()
+    valid = paths.valid.numpy()
+    a_real, a_imag = [x.numpy() for x in paths.a]
+    power = a_real**2 + a_imag**2
+    sources = paths.sources.numpy().T
+    targets = paths.targets.numpy().T
+    max_depth = vertices.shape[0]
+    num_paths = vertices.shape[-2]
+
+    if paths.synthetic_array:
+        power = power.sum(axis=(1, 3))
+        valid = valid.any(axis=(1, 3)) if valid.ndim == 5 else valid
+    else:
+        # Antenna dimensions are [num_patterns, array_size]; the patterns share the geometry
+        num_rx, num_tx = paths.num_rx, paths.num_tx
+        rx_patterns = len(paths.rx_array.antenna_pattern.patterns)
+        tx_patterns = len(paths.tx_array.antenna_pattern.patterns)
+        rx_size, tx_size = paths.rx_array.array_size, paths.tx_array.array_size
+        shape = [num_rx, rx_patterns, rx_size, num_tx, tx_patterns, tx_size, num_paths]
+        merged = [len(targets), len(sources), num_paths]
+        vertices = vertices.reshape(max_depth, *shape, 3)[:, :, 0, :, :, 0].reshape(max_depth, *merged, 3)
+        interactions = interactions.reshape(max_depth, *shape)[:, :, 0, :, :, 0].reshape(max_depth, *merged)
+        valid = valid.reshape(shape)[:, 0, :, :, 0].reshape(merged)
+        power = power.reshape(shape).sum(axis=(1, 4)).reshape(merged)
+
+    return {"vertices": vertices, "interactions": interactions, "valid": valid,
+            "sources": sources, "targets": targets, "power": power}
+
+
+def paths_polydata(vertices, interactions, valid, sources, targets, power) -> pv.PolyData:
+    """Polylines of the valid paths, see path_arrays() for the arguments"""
+    rx, tx, path = np.nonzero(valid)
+
+    # [max_depth + 2, num_valid, 3], source and target around the interactions
+    points = np.concatenate([sources[tx][None], vertices[:, rx, tx, path], targets[rx][None]])
+    types = np.concatenate([np.zeros((1, len(rx))), interactions[:, rx, tx, path], np.zeros((1, len(rx)))])
+    keep = np.concatenate([np.ones((1, len(rx)), bool), interactions[:, rx, tx, path] != 0,
+                           np.ones((1, len(rx)), bool)])
+    # Path by path
+    points = points.transpose(1, 0, 2)[keep.T]
+    types = types.T[keep.T]
+    counts = keep.sum(axis=0)
+
+    # Connectivity [n, id_0, ..., id_n-1] per line
+    lines = np.empty(len(points) + len(counts), dtype=np.int64)
+    heads = np.cumsum(counts + 1) - (counts + 1)
+    is_head = np.zeros(len(lines), bool)
+    is_head[heads] = True
+    lines[heads] = counts
+    lines[~is_head] = np.arange(len(points))
+
+    mesh = pv.PolyData(points.astype(np.float32), lines=lines if len(counts) != 0 else None)
+    mesh.point_data["interaction"] = types.astype(np.int32)
+    with np.errstate(divide="ignore"):
+        mesh.cell_data["power [dB]"] = np.where(power[rx, tx, path] > 0,
+                                                10*np.log10(power[rx, tx, path]), np.nan).astype(np.float32)
+    mesh.cell_data["num_interactions"] = (counts - 2).astype(np.int32)
+    mesh.cell_data["rx"] = rx.astype(np.int32)
+    mesh.cell_data["tx"] = tx.astype(np.int32)
+    mesh.cell_data["path"] = path.astype(np.int32)
+    return mesh
+
+
+def write_paths(output_dir: str, paths) -> str:
+    """
+    Writes the valid paths of a sionna.rt.Paths object as VTK polylines.
+
+    Returns:
+        The file name, relative to `output_dir`
+    """
+    mesh = paths_polydata(**path_arrays(paths))
+    mesh.save(os.path.join(output_dir, PATHS_OUTPUT))
+    logger.info(f"{mesh.n_cells} paths written to {PATHS_OUTPUT}")
+    return PATHS_OUTPUT